@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+
+import attacks
+from bitboard import COLORS, BISHOP, ROOK, QUEEN, squares
+
+SLIDERS = (BISHOP, ROOK, QUEEN)
+VALUES = (1, 3, 5, 9)
+
+
+class AttackMap:
+
+    """Per-square cover counts for both colors, updated as pieces come and go
+
+    covers[sq] is the bitboard of squares covered by the piece on sq and
+    covered_by[sq] the bitboard of squares holding a piece that covers sq.
+    count, value and by_value are indexed [side][sq] (by_value is indexed
+    [side][piece value][sq]) by the color code and sum up the pieces covering
+    each square.
+    """
+
+    def __init__(self, bitboards):
+        self.bitboards = bitboards
+        self.pieces = [None] * 64
+        self.covers = [0] * 64
+        self.covered_by = [0] * 64
+        self.count = [[0] * 64 for color in COLORS]
+        self.value = [[0] * 64 for color in COLORS]
+        self.by_value = [{value: [0] * 64 for value in VALUES} for color in COLORS]
+
+    def load(self, board):
+        """Rebuild the map from an 8x8 list board, with the bitboards already loaded"""
+        self.__init__(self.bitboards)
+        for row in range(8):
+            for col in range(8):
+                if board[row][col] is not None:
+                    self.pieces[row * 8 + col] = board[row][col]
+        for sq in range(64):
+            if self.pieces[sq] is not None:
+                self._set_covers(sq, self._compute_covers(sq))
+
+    def add(self, piece, sq):
+        """Account for a piece placed on sq, after the bitboards were updated"""
+        self.pieces[sq] = piece
+        self._update_sliders(sq)
+        self._set_covers(sq, self._compute_covers(sq))
+
+    def remove(self, sq):
+        """Account for the piece taken off sq, after the bitboards were updated"""
+        self._set_covers(sq, 0)
+        self.pieces[sq] = None
+        self._update_sliders(sq)
+
+    def least_valuable(self, side, sq):
+        """Value of the cheapest piece of a side covering sq, 0 if there is none"""
+        by_value = self.by_value[side]
+        for value in VALUES:
+            if by_value[value][sq]:
+                return value
+        return 0
+
+    def _compute_covers(self, sq):
+        piece = self.pieces[sq]
+        return attacks.piece_attacks(piece.kind, piece.side, sq, self.bitboards.all)
+
+    def _update_sliders(self, sq):
+        """Sliders covering sq see further or shorter once its occupancy changed"""
+        for other in squares(self.covered_by[sq]):
+            if self.pieces[other].kind in SLIDERS:
+                self._set_covers(other, self._compute_covers(other))
+
+    def _set_covers(self, sq, new):
+        old = self.covers[sq]
+        if old == new:
+            return
+        self.covers[sq] = new
+        piece = self.pieces[sq]
+        side, piece_value = piece.side, piece.value
+        count = self.count[side]
+        value = self.value[side]
+        by_value = self.by_value[side][piece_value]
+        mask = 1 << sq
+        for target in squares(old & ~new):
+            count[target] -= 1
+            value[target] -= piece_value
+            by_value[target] -= 1
+            self.covered_by[target] ^= mask
+        for target in squares(new & ~old):
+            count[target] += 1
+            value[target] += piece_value
+            by_value[target] += 1
+            self.covered_by[target] |= mask
@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+
+# Per-square attack tables, built once when the module is first imported.
+# Squares and bitboards follow the numbering described in bitboard.py.
+
+import magic
+from bitboard import (BISHOP_DIRECTIONS, COLORS, DIRECTIONS, FULL, ROOK_DIRECTIONS,
+                      knight_attacks, king_attacks, pawn_attacks, popcount)
+
+KNIGHT = [knight_attacks(1 << sq) for sq in range(64)]
+KING = [king_attacks(1 << sq) for sq in range(64)]
+# Indexed [side][sq] by the color code
+PAWN = [[pawn_attacks(1 << sq, side) for sq in range(64)] for side in range(len(COLORS))]
+
+# RAYS[d][sq] holds every square from sq (excluded) to the edge of the board
+# along bitboard.DIRECTIONS[d]. A ray is positive when it walks towards
+# higher square numbers, so its nearest blocker is its lowest set bit.
+RAYS = []
+POSITIVE = []
+for dr, dc in DIRECTIONS:
+    table = []
+    for sq in range(64):
+        ray = 0
+        r, c = (sq >> 3) + dr, (sq & 7) + dc
+        while 0 <= r < 8 and 0 <= c < 8:
+            ray |= 1 << (r * 8 + c)
+            r, c = r + dr, c + dc
+        table.append(ray)
+    RAYS.append(table)
+    POSITIVE.append(dr * 8 + dc > 0)
+
+# BETWEEN[a][b] holds the squares strictly between a and b and LINE[a][b] the
+# whole line through both, edge to edge. Both are 0 unless a and b share a
+# row, column or diagonal.
+BETWEEN = [[0] * 64 for sq in range(64)]
+LINE = [[0] * 64 for sq in range(64)]
+for d in range(8):
+    rays, opposite = RAYS[d], RAYS[d ^ 1]
+    for a in range(64):
+        for b in range(64):
+            if rays[a] >> b & 1:
+                BETWEEN[a][b] = rays[a] & opposite[b]
+                LINE[a][b] = rays[a] | opposite[a] | 1 << a
+
+
+def _first_blocker(sq, occupied, d):
+    ray = RAYS[d][sq]
+    blockers = ray & occupied
+    if blockers:
+        if POSITIVE[d]:
+            ray ^= RAYS[d][(blockers & -blockers).bit_length() - 1]
+        else:
+            ray ^= RAYS[d][blockers.bit_length() - 1]
+    return ray
+
+
+def ray_rook_attacks(sq, occupied):
+    return (_first_blocker(sq, occupied, 0) | _first_blocker(sq, occupied, 1) |
+            _first_blocker(sq, occupied, 2) | _first_blocker(sq, occupied, 3))
+
+
+def ray_bishop_attacks(sq, occupied):
+    return (_first_blocker(sq, occupied, 4) | _first_blocker(sq, occupied, 5) |
+            _first_blocker(sq, occupied, 6) | _first_blocker(sq, occupied, 7))
+
+
+# Magic lookup tables for sliders, see magic.py.
+ROOK_MAGICS, BISHOP_MAGICS = magic.load()
+ROOK_MASKS = [magic.relevant_mask(sq, ROOK_DIRECTIONS) for sq in range(64)]
+BISHOP_MASKS = [magic.relevant_mask(sq, BISHOP_DIRECTIONS) for sq in range(64)]
+ROOK_SHIFTS = [64 - popcount(mask) for mask in ROOK_MASKS]
+BISHOP_SHIFTS = [64 - popcount(mask) for mask in BISHOP_MASKS]
+ROOK_TABLES = [magic.fill(sq, ROOK_MASKS[sq], ROOK_MAGICS[sq], ray_rook_attacks) for sq in range(64)]
+BISHOP_TABLES = [magic.fill(sq, BISHOP_MASKS[sq], BISHOP_MAGICS[sq], ray_bishop_attacks) for sq in range(64)]
+
+
+def rook_attacks(sq, occupied):
+    return ROOK_TABLES[sq][((occupied & ROOK_MASKS[sq]) * ROOK_MAGICS[sq] & FULL) >> ROOK_SHIFTS[sq]]
+
+
+def bishop_attacks(sq, occupied):
+    return BISHOP_TABLES[sq][((occupied & BISHOP_MASKS[sq]) * BISHOP_MAGICS[sq] & FULL) >> BISHOP_SHIFTS[sq]]
+
+
+def queen_attacks(sq, occupied):
+    return (ROOK_TABLES[sq][((occupied & ROOK_MASKS[sq]) * ROOK_MAGICS[sq] & FULL) >> ROOK_SHIFTS[sq]] |
+            BISHOP_TABLES[sq][((occupied & BISHOP_MASKS[sq]) * BISHOP_MAGICS[sq] & FULL) >> BISHOP_SHIFTS[sq]])
+
+
+def _pawn_attacks(side, sq, occupied):
+    return PAWN[side][sq]
+
+
+def _knight_attacks(side, sq, occupied):
+    return KNIGHT[sq]
+
+
+def _bishop_attacks(side, sq, occupied):
+    return bishop_attacks(sq, occupied)
+
+
+def _rook_attacks(side, sq, occupied):
+    return rook_attacks(sq, occupied)
+
+
+def _queen_attacks(side, sq, occupied):
+    return queen_attacks(sq, occupied)
+
+
+def _king_attacks(side, sq, occupied):
+    return KING[sq]
+
+
+# piece_attacks by piece type code
+PIECE_ATTACKS = (_pawn_attacks, _knight_attacks, _bishop_attacks,
+                 _rook_attacks, _queen_attacks, _king_attacks)
+
+
+def piece_attacks(kind, side, sq, occupied):
+    """Squares covered by a piece, whoever stands on them"""
+    return PIECE_ATTACKS[kind](side, sq, occupied)
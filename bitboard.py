@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+
+# Squares are numbered row * 8 + col, so square 0 is (0, 0) in the top left
+# corner (black's back rank) and square 63 is (7, 7). Bit n of a bitboard is
+# set when square n is part of the set.
+
+COLORS = ('white', 'black')
+PIECE_TYPES = ('pawn', 'knight', 'bishop', 'rook', 'queen', 'king')
+# Integer codes of the colors and piece types, indexing the tuples above
+WHITE, BLACK = range(2)
+PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING = range(6)
+
+FULL = 0xFFFFFFFFFFFFFFFF
+FILE_A = 0x0101010101010101
+FILE_H = FILE_A << 7
+NOT_FILE_A = FULL ^ FILE_A
+NOT_FILE_H = FULL ^ FILE_H
+NOT_FILE_AB = NOT_FILE_A & (FULL ^ (FILE_A << 1))
+NOT_FILE_GH = NOT_FILE_H & (FULL ^ (FILE_A << 6))
+
+# (row step, col step) of the eight rays, rook directions first. Opposite
+# directions sit next to each other, so direction d ^ 1 is the reverse of d.
+ROOK_DIRECTIONS = ((0, 1), (0, -1), (1, 0), (-1, 0))
+BISHOP_DIRECTIONS = ((1, 1), (-1, -1), (1, -1), (-1, 1))
+DIRECTIONS = ROOK_DIRECTIONS + BISHOP_DIRECTIONS
+
+
+def square(row, col):
+    return row * 8 + col
+
+
+def bit(row, col):
+    return 1 << (row * 8 + col)
+
+
+def coords(sq):
+    return (sq >> 3, sq & 7)
+
+
+# coords of every square, made once so callers need not build the tuples
+COORDS = tuple(coords(sq) for sq in range(64))
+
+
+def popcount(bb):
+    return bin(bb).count('1')
+
+
+def lsb(bb):
+    """Index of the lowest set bit"""
+    return (bb & -bb).bit_length() - 1
+
+
+def squares(bb):
+    """Yield the square index of every set bit, lowest first"""
+    while bb:
+        low = bb & -bb
+        yield low.bit_length() - 1
+        bb ^= low
+
+
+def to_moves(bb):
+    """Convert a bitboard to the (row, col) list used by the rest of the game"""
+    moves = []
+    while bb:
+        low = bb & -bb
+        sq = low.bit_length() - 1
+        moves.append((sq >> 3, sq & 7))
+        bb ^= low
+    return moves
+
+
+def knight_attacks(bb):
+    return ((bb << 17 & NOT_FILE_A) | (bb << 15 & NOT_FILE_H) |
+            (bb >> 15 & NOT_FILE_A) | (bb >> 17 & NOT_FILE_H) |
+            (bb << 10 & NOT_FILE_AB) | (bb << 6 & NOT_FILE_GH) |
+            (bb >> 6 & NOT_FILE_AB) | (bb >> 10 & NOT_FILE_GH)) & FULL
+
+
+def king_attacks(bb):
+    sides = (bb << 1 & NOT_FILE_A) | (bb >> 1 & NOT_FILE_H)
+    row = bb | sides
+    return (sides | row << 8 | row >> 8) & FULL
+
+
+def pawn_attacks(bb, side):
+    """Squares attacked diagonally by the pawns of a side in bb"""
+    if side == WHITE:
+        return (bb >> 7 & NOT_FILE_A) | (bb >> 9 & NOT_FILE_H)
+    return (bb << 9 & NOT_FILE_A | bb << 7 & NOT_FILE_H) & FULL
+
+
+def slide(sq, occupied, directions):
+    """Squares reached from sq along each direction, up to and including the first blocker"""
+    attacks = 0
+    row, col = sq >> 3, sq & 7
+    for dr, dc in directions:
+        r, c = row + dr, col + dc
+        while 0 <= r < 8 and 0 <= c < 8:
+            target = 1 << (r * 8 + c)
+            attacks |= target
+            if occupied & target:
+                break
+            r, c = r + dr, c + dc
+    return attacks
+
+
+class Bitboards:
+
+    """One bitboard per color and piece type, plus the occupancy boards
+
+    pieces is indexed [side][kind] and occupied [side], by the color and
+    piece type codes.
+    """
+
+    def __init__(self):
+        self.pieces = [[0] * len(PIECE_TYPES) for color in COLORS]
+        self.occupied = [0] * len(COLORS)
+        self.all = 0
+
+    def load(self, board):
+        """Rebuild every bitboard from an 8x8 list board"""
+        self.__init__()
+        for row in range(8):
+            for col in range(8):
+                piece = board[row][col]
+                if piece is not None:
+                    self.add(piece.side, piece.kind, row * 8 + col)
+
+    def add(self, side, kind, sq):
+        mask = 1 << sq
+        self.pieces[side][kind] |= mask
+        self.occupied[side] |= mask
+        self.all |= mask
+
+    def remove(self, side, kind, sq):
+        mask = ~(1 << sq)
+        self.pieces[side][kind] &= mask
+        self.occupied[side] &= mask
+        self.all &= mask
@@ -1,10 +1,24 @@
 #!/usr/bin/env python3
 
+import attacks
+import bitboard
+import search
+import transposition
+import zobrist
+from bitboard import WHITE, BLACK, PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING
+
+# Size of the table caching is_move_safe when the game does not share one
+SAFETY_TABLE_MEGABYTES = 2
+
+class Stopped(Exception):
+    pass
+
 class AI:
 
-    def __init__(self, game, color):
+    def __init__(self, game, color, table=None):
 
         self.color = color
+        self.side = bitboard.COLORS.index(color)
         self.enemy_color = self.get_enemy_color()
         self.whites = self.get_white_pieces(game)
         self.blacks = self.get_black_pieces(game)
@@ -18,69 +32,53 @@ class AI:
         self.coverage = 0
         self.debug = 'No debug.'
         self.phase = self.set_phase(game)
+        if table is None:
+            table = transposition.TranspositionTable(SAFETY_TABLE_MEGABYTES)
+        self.table = table
+        self.stopped = False
 
-    def get_white_pieces(self, game):
-
-        white_pieces = []
+    def stop(self):
+        """Make play return without moving, from any thread"""
+        self.stopped = True
 
-        for row in range(8):
-            for col in range(8):
-                piece = game.board[row][col]
-                if piece is not None and piece.color == 'white' and piece not in white_pieces:
-                    white_pieces.append(piece)
-        return white_pieces
+    def get_white_pieces(self, game):
+        return game.get_pieces('white')
 
     def get_black_pieces(self, game):
-
-        black_pieces = []
-
-        for row in range(8):
-            for col in range(8):
-                piece = game.board[row][col]
-                if piece is not None and piece.color == 'black' and piece not in black_pieces:
-                    black_pieces.append(piece)
-        return black_pieces
+        return game.get_pieces('black')
     
     def get_value(self, game):
 
-        if self.color == 'black':
+        if self.side == BLACK:
             return game.blacks_value
         else:
             return game.whites_value
 
     def get_cell_content(self, game, cell):
-
-        for row in range(8):
-            for col in range(8):
-                if (row, col) == cell:
-                    return game.board[row][col]
-        return None
+        return game.board[cell[0]][cell[1]]
 
     def get_team(self, game):
 
-        if self.color == 'black':
+        if self.side == BLACK:
             return self.get_black_pieces(game)
         else:
             return self.get_white_pieces(game)
         
     def get_enemies(self, game):
 
-        if self.color == 'black':
+        if self.side == BLACK:
             return self.get_white_pieces(game)
         else:
             return self.get_black_pieces(game)
         
     def get_enemy_color(self):
 
-        if self.color == 'black':
-            return 'white'
-        else:
-            return 'black'
+        return bitboard.COLORS[self.side ^ 1]
         
     def set_phase(self, game):
         
         for piece in self.get_team(game):
-            if piece.type in ['king', 'bishop', 'knight'] and not piece.has_moved:
+            if piece.kind in (KING, BISHOP, KNIGHT) and not piece.has_moved:
                 return 'opening'
         return 'middle'
         
@@ -90,30 +88,25 @@ class AI:
         best_protection = 0
         reachable_team = []
         
-        for piece in self.team:
-            moves = game.get_legal_moves(piece)
-            original_cell = piece.position
+        for piece, moves in game.get_all_legal_moves(self.color).items():
             for move in moves:
-                original_content = self.get_cell_content(game, move)
                 content = self.get_cell_content(game, move)
                 if not self.is_move_safe(game, piece, move):
                     continue
-                game.make_test_move(piece, move)
-                new_moves = self.get_covering_moves(game, piece)
-                for new_move in new_moves:
-                    content = self.get_cell_content(game, new_move)
-                    if content and content.color == self.color and \
+                game.push(piece, move)
+                for sq in bitboard.squares(self.get_covering_moves(game, piece)):
+                    content = game.board[sq >> 3][sq & 7]
+                    if content and content.side == self.side and \
                     content not in reachable_team:
                         reachable_team.append(content)
-                game.make_test_move(piece, original_cell)
-                game.board[move[0]][move[1]] = original_content
+                game.pop()
 
         for piece in reachable_team:
             data = self.get_cell_data(game, piece.position)
             if best == None or data[3] - data[1] < best_protection or \
-            (data[3] - data[1] <= best_protection and self.color == 'black' and \
+            (data[3] - data[1] <= best_protection and self.side == BLACK and \
             piece.position[0] > best.position[0]) or \
-            (data[3] - data[1] <= best_protection and self.color == 'white' and \
+            (data[3] - data[1] <= best_protection and self.side == WHITE and \
             piece.position[0] < self.best_piece.position[0]):
                 best = piece
                 best_protection = data[3] - data[1]
@@ -141,25 +134,23 @@ class AI:
                 self.best_move = (3, 4)
                 self.debug = 'First move.'
                 return
-        for piece in self.get_team(game):
-            if piece.has_moved or piece.type == 'queen':
+        for piece, moves in game.get_all_legal_moves(self.color).items():
+            if piece.has_moved or piece.kind == QUEEN:
                 continue
-            moves = game.get_legal_moves(piece)
             for move in moves:
                 if not self.is_move_safe(game, piece, move):
                     continue
-                if not self.best_move and piece.type == 'pawn' and self.priority <= 1:
+                if not self.best_move and piece.kind == PAWN and self.priority <= 1:
                     self.find_good_pawn_move(game, piece, move)
-                if piece.type == 'knight':
+                if piece.kind == KNIGHT:
                     self.find_good_knight_move(game, piece, move)
-                if piece.type == 'bishop':
+                if piece.kind == BISHOP:
                     self.find_good_bishop_move(game, piece, move)
         if self.best_move:
             return
-        for piece in self.get_team(game):
-            if piece.type != 'pawn':
+        for piece, moves in game.get_all_legal_moves(self.color).items():
+            if piece.kind != PAWN:
                 continue
-            moves = game.get_legal_moves(piece)
             for move in moves:
                 if self.is_move_safe(game, piece, move):
                     self.best_piece, self.best_move = piece, move
@@ -173,16 +164,16 @@ class AI:
         if self.best_move or not vulnerable_piece:
             return
         for piece in self.team:
-            if piece.type != 'pawn' and game.turns <= 6:
+            if piece.kind != PAWN and game.turns <= 6:
                 continue
-            if (piece.type == 'rook' and piece.has_moved == False) or (piece.type == 'king' 
+            if (piece.kind == ROOK and piece.has_moved == False) or (piece.kind == KING 
             and piece.has_moved == False and not game.is_in_check(self.color)):
                 continue
             moves = game.get_legal_moves(piece)
             for move in moves:
                 if not self.is_move_safe(game, piece, move) or len(self.get_team(game)) <= 1:
                    continue
-                if piece.type == 'rook':
+                if piece.kind == ROOK:
                     self.find_good_rook_move(game, piece, move)
                 if (self.will_move_help(game, piece, vulnerable_piece, move)) and \
                 self.priority < vulnerable_piece.value:
@@ -197,17 +188,15 @@ class AI:
 
         if self.best_move:
             return
-        for piece in self.get_team(game):
-            moves = game.get_legal_moves(piece)
+        for piece, moves in game.get_all_legal_moves(self.color).items():
             for move in moves:
                 if self.is_move_safe(game, piece, move) and \
-                len(game.get_legal_moves(piece)) > self.coverage:
+                len(moves) > self.coverage:
                     self.best_piece, self.best_move = piece, move
-                    self.coverage = len(game.get_legal_moves(piece))
+                    self.coverage = len(moves)
                     self.debug = 'Doing a random but safe move.'
                     return
-        for piece in self.get_team(game):
-            moves = game.get_legal_moves(piece)
+        for piece, moves in game.get_all_legal_moves(self.color).items():
             for move in moves:
                 self.best_piece, self.best_move = piece, move
                 self.debug = 'Doing a completely random move.'
@@ -217,14 +206,14 @@ class AI:
         if (move[0] in [0, 7] or move[1] in [0, 7]):
             return
         for row in range(8):
-            if piece.color == 'white' and move[0] < row:
+            if piece.side == WHITE and move[0] < row:
                 continue
-            if piece.color == 'black' and move[0] > row:
+            if piece.side == BLACK and move[0] > row:
                 continue
             content = game.board[row][move[1]]
-            if (content and content.type == 'pawn' and 
-            content.color == piece.color and \
-            self.coverage < len(self.get_covering_moves(game, piece))):
+            if (content and content.kind == PAWN and 
+            content.side == piece.side and \
+            self.coverage < bitboard.popcount(self.get_covering_moves(game, piece))):
                 self.best_piece, self.best_move = piece, move
                 self.coverage = len(game.get_legal_moves(piece))
                 self.priority = 3
@@ -233,27 +222,20 @@ class AI:
     def find_good_bishop_move(self, game, piece, move):
 
         covering = len(game.get_legal_moves(piece))
-        prev_pos = piece.position
-        prev_content = game.board[move[0]][move[1]]
-        
-        game.make_test_move(piece, move)
+        game.push(piece, move)
         new_covering = len(game.get_legal_moves(piece))
         if (new_covering > covering and self.coverage < new_covering):
-            game.make_test_move(piece, prev_pos)
-            game.board[move[0]][move[1]] = prev_content
+            game.pop()
             self.coverage = new_covering
             self.best_piece, self.best_move = piece, move
             self.debug = 'Bishop moves to cover more space.'
             self.priority = 3
         else:
-            game.make_test_move(piece, prev_pos)
-            game.board[move[0]][move[1]] = prev_content
+            game.pop()
 
     def find_good_pawn_move(self, game, piece, move):
 
         vulnerable = self.find_piece_to_help(game)
-        prev_cell = piece.position
-        prev_content = self.get_cell_content(game, move)
         prev_coverage = 0
         coverage = 0
 
@@ -262,15 +244,15 @@ class AI:
             self.priority = 1
             self.debug = 'Pawn supports ' + vulnerable.type + '.'
         for ally in self.get_team(game):
-            if ally.type in ['knight', 'bishop']:
+            if ally.kind in (KNIGHT, BISHOP):
                 prev_coverage += len(game.get_legal_moves(ally))
-        game.make_test_move(piece, move)
+        game.push(piece, move)
         for ally in self.get_team(game):
-            if ally.type in ['knight', 'bishop']:
-                if ally.type == 'knight':
+            if ally.kind in (KNIGHT, BISHOP):
+                if ally.kind == KNIGHT:
                     moves = game.get_legal_moves(ally)
-                    for move in moves:
-                        if move[0] in [0, 7] or move[1] in [0, 7]:
+                    for ally_move in moves:
+                        if ally_move[0] in [0, 7] or ally_move[1] in [0, 7]:
                             continue
                         else:
                             coverage += 1
@@ -281,8 +263,7 @@ class AI:
             self.best_coverage = coverage
             self.priority = 1
             self.debug = 'Pawn opens space for allies.'
-        game.make_test_move(piece, prev_cell)
-        game.board[move[0]][move[1]] = prev_content
+        game.pop()
 
     def find_good_rook_move(self, game, piece, move):
 
@@ -301,74 +282,44 @@ class AI:
         # rank 2-3: same thing but for allies.
         # rank 4-5: VALUE of the weakest enemy / ally attacking the cell.
 
-        data = [0, 0, 0, 0, None, []]
-
-        for row in range(8):
-            for col in range(8):
-                piece = game.board[row][col]
-                if piece == None:
-                    continue
-                moves = self.get_covering_moves(game, piece)
-                for move in moves:
-                    if move == cell:
-                        if piece.color != self.color:
-                            data[0] += 1
-                            data[1] += piece.value
-                            if not data[4] or piece.value < data[4]:
-                                data[4] = piece.value
-                        if piece.color == self.color:
-                            data[2] += 1
-                            data[3] += piece.value
-                            if not data[5] or piece.value < data[5]:
-                                data[5] = piece.value
-        return data
+        sq = cell[0] * 8 + cell[1]
+        attack_map = game.attack_map
+        team = self.side
+        enemy = team ^ 1
+        return [attack_map.count[enemy][sq], attack_map.value[enemy][sq],
+                attack_map.count[team][sq], attack_map.value[team][sq],
+                attack_map.least_valuable(enemy, sq) or None,
+                attack_map.least_valuable(team, sq) or []]
 
     def is_move_safe(self, game, piece, move):
 
-        original_cell = piece.position
-        original_content = self.get_cell_content(game, move)
-        already_harmed = []
-
-        game.make_test_move(piece, move)
-        if original_content and (original_content.value > piece.value \
-        or not self.is_in_danger(game, piece)):
-            game.make_test_move(piece, original_cell)
-            game.board[move[0]][move[1]] = original_content
-            return True
-        if self.can_enemy_checkmate(game):
-            game.make_test_move(piece, original_cell)
-            game.board[move[0]][move[1]] = original_content
-            return False
-        for ally in self.get_team(game):
-            if self.is_in_danger(game, ally):
-                already_harmed.append(ally)
-        for ally in self.get_team(game):
-            if self.is_in_danger(game, ally) and ally not in already_harmed:
-                game.make_test_move(piece, original_cell)
-                game.board[move[0]][move[1]] = original_content
-                return False
-        for enemy in self.get_enemies(game):
-            moves = game.get_legal_moves(enemy)
-            prev_cell = enemy.position
-            for move_en in moves:
-                prev_content = self.get_cell_content(game, move_en)
-                game.make_test_move(enemy, move_en)
-                if self.is_in_danger(game, piece):
-                    game.make_test_move(enemy, prev_cell)
-                    game.board[move_en[0]][move_en[1]] = prev_content
-                    game.make_test_move(piece, original_cell)
-                    game.board[move[0]][move[1]] = original_content
-                    return False
-                game.make_test_move(enemy, prev_cell)
-                game.board[move_en[0]][move_en[1]] = prev_content
-        if self.is_in_danger(game, piece):
-            game.make_test_move(piece, original_cell)
-            game.board[move[0]][move[1]] = original_content
+        # Every candidate move is checked here, so a stopped AI gives up here too
+        if self.stopped:
+            raise Stopped()
+        # Cached per position and move; the score is 1 for safe and 0 for unsafe
+        row, col = piece.position
+        key = game.hash ^ zobrist.MOVES[row * 8 + col][move[0] * 8 + move[1]]
+        entry = self.table.probe(key)
+        if entry is not None:
+            return entry[1] == 1
+        safe = self.check_move_safety(game, piece, move)
+        self.table.store(key, 0, int(safe), transposition.EXACT,
+                         transposition.encode_move(piece.position, move))
+        return safe
+
+    def check_move_safety(self, game, piece, move):
+
+        # Material lost or won on the square once every capture there is traded off
+        exchange = search.see(game, piece, move)
+        if exchange < 0:
             return False
-        else:
-            game.make_test_move(piece, original_cell)
-            game.board[move[0]][move[1]] = original_content
+        if exchange > 0 and search.is_capture(game, piece, move):
             return True
+
+        game.push(piece, move)
+        safe = not self.can_enemy_checkmate(game)
+        game.pop()
+        return safe
     
     def is_in_danger(self, game, piece):
 
@@ -384,33 +335,24 @@ class AI:
     
     def will_move_protect(self, game, piece_moving, piece_defended, move):
 
-        original_cell = piece_moving.position
-        original_content = self.get_cell_content(game, move)
-
-        game.make_test_move(piece_moving, move)
+        game.push(piece_moving, move)
         if self.is_in_danger(game, piece_defended):
-            game.make_test_move(piece_moving, original_cell)
-            game.board[move[0]][move[1]] = original_content
+            game.pop()
             return False
-        game.make_test_move(piece_moving, original_cell)
-        game.board[move[0]][move[1]] = original_content
+        game.pop()
         return True
     
     def will_move_help(self, game, piece, piece_defended, move):
 
-        original_cell = piece.position
-        original_content = self.get_cell_content(game, move)
         original_data = self.get_cell_data(game, piece_defended.position)
 
-        game.make_test_move(piece, move)
+        game.push(piece, move)
         data = self.get_cell_data(game, piece_defended.position)
         if data[2] > original_data[2]:
-            game.make_test_move(piece, original_cell)
-            game.board[move[0]][move[1]] = original_content
+            game.pop()
             return True
         else:
-            game.make_test_move(piece, original_cell)
-            game.board[move[0]][move[1]] = original_content
+            game.pop()
             return False
 
     def attack(self, game, piece, moves):
@@ -418,7 +360,7 @@ class AI:
         for move in moves:
             content = self.get_cell_content(game, move)
             data = self.get_cell_data(game, piece.position)
-            if content and piece.type == 'pawn' and content.type == 'pawn' \
+            if content and piece.kind == PAWN and content.kind == PAWN \
             and not self.priority and data[5] == 1:
                 self.best_piece, self.best_move = piece, move
                 self.priority = 1
@@ -438,17 +380,15 @@ class AI:
         nb_targets = 0
         biggest_target = 0
         almost_biggest_target = 0
-        prev_cell = piece.position
-        prev_content = self.get_cell_content(game, move)
 
-        game.make_test_move(piece, move)
+        game.push(piece, move)
         moves = game.get_legal_moves(piece)
         for target in moves:
             content = self.get_cell_content(game, target)
             if not content:
                 continue
             value = content.value
-            if content.type == 'king':
+            if content.kind == KING:
                 value = 10
             if value > piece.value or self.is_move_safe(game, piece, target):
                 nb_targets += 1
@@ -460,8 +400,7 @@ class AI:
                     self.best_piece, self.best_move = piece, move
                     self.priority = almost_biggest_target
                     self.debug = 'Doing a fork to pieces of value ' + str(biggest_target) + ' and ' + str(almost_biggest_target) + '.'
-        game.make_test_move(piece, prev_cell)
-        game.board[move[0]][move[1]] = prev_content
+        game.pop()
     
     def play_king(self, game, piece, moves):
 
@@ -475,14 +414,13 @@ class AI:
     def duck(self, game, piece):
 
         doomed = True
-        for ally in self.get_team(game):
-            moves = game.get_legal_moves(ally)
+        for ally, moves in game.get_all_legal_moves(self.color).items():
             for move in moves:
-                if ally.type == 'king' and not ally.has_moved:
+                if ally.kind == KING and not ally.has_moved:
                     continue
                 if not self.is_move_safe(game, ally, move):
                     continue
-                if ally.type == 'knight' and (move[0] in [0, 7] or move[1] in [0, 7]):
+                if ally.kind == KNIGHT and (move[0] in [0, 7] or move[1] in [0, 7]):
                     continue
                 if self.will_move_protect(game, ally, piece, move):
                     content = self.get_cell_content(game, move)
@@ -507,11 +445,11 @@ class AI:
                 
     def check_promote(self, game, piece):
 
-        if piece.type != 'pawn':
+        if piece.kind != PAWN:
             return
-        if piece.color == 'black' and piece.position[0] != 6:
+        if piece.side == BLACK and piece.position[0] != 6:
             return
-        if piece.color == 'white' and piece.position[0] != 1:
+        if piece.side == WHITE and piece.position[0] != 1:
             return
         moves = game.get_legal_moves(piece)
         for move in moves:
@@ -521,27 +459,20 @@ class AI:
 
     def can_enemy_checkmate(self, game):
 
-        for piece in self.get_enemies(game):
-            original_cell = piece.position
-            moves = game.get_legal_moves(piece)
+        team_safe = False
+
+        for piece, moves in game.get_all_legal_moves(self.enemy_color).items():
             for move in moves:
-                original_content = self.get_cell_content(game, move)
-                game.make_test_move(piece, move)
+                game.push(piece, move)
                 if not game.is_in_check(self.color):
-                    game.make_test_move(piece, original_cell)
-                    game.board[move[0]][move[1]] = original_content
+                    game.pop()
                     continue
-                for team in self.get_team(game):
-                    moves_team = game.get_legal_moves(team)
-                    if len(moves_team) != 0:
-                        team_safe = True
-                        break
+                if game.has_legal_moves(self.color):
+                    team_safe = True
                 if team_safe == False:
-                    game.make_test_move(piece, original_cell)
-                    game.board[move[0]][move[1]] = original_content
+                    game.pop()
                     return True
-                game.make_test_move(piece, original_cell)
-                game.board[move[0]][move[1]] = original_content
+                game.pop()
         return False
 
     def look_for_checkmate(self, game):
@@ -549,191 +480,97 @@ class AI:
         enemy_safe = False
         team_safe = False
 
-        for piece in self.get_team(game):
-            original_cell = piece.position
-            moves = game.get_legal_moves(piece)
+        for piece, moves in game.get_all_legal_moves(self.color).items():
             for move in moves:
-                original_content = self.get_cell_content(game, move)
-                game.make_test_move(piece, move)
+                game.push(piece, move)
                 if not game.is_in_check(self.enemy_color):
-                    game.make_test_move(piece, original_cell)
-                    game.board[move[0]][move[1]] = original_content
+                    game.pop()
                     continue
-                for enemy in self.get_enemies(game):    
-                    moves_en = game.get_legal_moves(enemy)
-                    if len(moves_en) != 0:
-                        enemy_safe = True
-                        break
+                if game.has_legal_moves(self.enemy_color):
+                    enemy_safe = True
                 if enemy_safe == False:
-                    game.make_test_move(piece, original_cell)
-                    game.board[move[0]][move[1]] = original_content
+                    game.pop()
                     self.best_piece, self.best_move = piece, move
                     self.debug = 'Found checkmate.'
                     return
-                game.make_test_move(piece, original_cell)
-                game.board[move[0]][move[1]] = original_content
+                game.pop()
 
-        for piece in self.get_enemies(game):
-            original_cell = piece.position
-            moves = game.get_legal_moves(piece)
+        for piece, moves in game.get_all_legal_moves(self.enemy_color).items():
             for move in moves:
-                original_content = self.get_cell_content(game, move)
-                game.make_test_move(piece, move)
+                game.push(piece, move)
                 if not game.is_in_check(self.color):
-                    game.make_test_move(piece, original_cell)
-                    game.board[move[0]][move[1]] = original_content
+                    game.pop()
                     continue
-                for enemy in self.get_team(game):
-                    moves_en = game.get_legal_moves(enemy)
-                    if len(moves_en) != 0:
-                        team_safe = True
-                        break
+                if game.has_legal_moves(self.color):
+                    team_safe = True
                 if team_safe == False:
-                    game.make_test_move(piece, original_cell)
-                    game.board[move[0]][move[1]] = original_content
+                    game.pop()
                     self.best_piece, self.best_move = piece, move
                     self.debug = 'Avoiding checkmate.'
-                game.make_test_move(piece, original_cell)
-                game.board[move[0]][move[1]] = original_content
+                game.pop()
                     
     def play(self, game):
 
+        try:
+            self.choose_move(game)
+        except Stopped:
+            return
+        if not self.best_move or not self.best_piece:
+            print("Error.")
+            game.game_over = True
+            game.winner = 'Player'
+            return
+        game.make_move(self.best_piece, self.best_move)
+        self.debug += ' Phase: ' + str(self.phase) + '.'
+        print(self.debug)
+        return
+
+    def choose_move(self, game):
+
         can_checkmate = False
 
         self.look_for_checkmate(game)
         if self.best_piece:
             can_checkmate = True
-        for piece in self.get_team(game):
+        for piece, moves in game.get_all_legal_moves(self.color).items():
             if can_checkmate:
                 break
             if self.is_in_danger(game, piece):
                 self.duck(game, piece)
-            moves = game.get_legal_moves(piece)
-            if piece.type == 'king' and self.priority == 0:
+            if piece.kind == KING and self.priority == 0:
                 self.play_king(game, piece, moves)
             else:
                 self.attack(game, piece, moves)
         if self.best_move == None and not can_checkmate:
             self.get_passive_move(game)
-        if not self.best_move or not self.best_piece:
-            print("Error.")
-            game.game_over = True
-            game.winner = 'Player'
-            return
-        game.make_move(self.best_piece, self.best_move)
-        self.debug += ' Phase: ' + str(self.phase) + '.'
-        print(self.debug)
-        return
     
     def get_covering_moves(self, game, piece):
 
-        """Get moves without considering check and allies"""
-        moves = []
+        """Get moves without considering check and allies, as a bitboard"""
         row, col = piece.position
-        
-        if piece.type == 'pawn':
-            moves = self.get_pawn_covers(piece, row, col)
-        elif piece.type == 'rook':
-            moves = self.get_rook_covers(game, row, col)
-        elif piece.type == 'knight':
-            moves = self.get_knight_covers(row, col)
-        elif piece.type == 'bishop':
-            moves = self.get_bishop_covers(game, row, col)
-        elif piece.type == 'queen':
-            moves = self.get_queen_covers(game, row, col)
-        elif piece.type == 'king':
-            moves = self.get_king_covers(game, row, col)
-        return moves
+        return COVERS[piece.kind](self, game, piece, row * 8 + col)
     
-    def get_pawn_covers(self, piece, row, col):
-
-        moves = []
-
-        if piece.color == 'white':
-            if col != 0:
-                moves.append((row - 1, col - 1))
-            if col != 7:
-                moves.append((row - 1, col + 1))
-        if piece.color == 'black':
-            if col != 0:
-                moves.append((row + 1, col - 1))
-            if col != 7:
-                moves.append((row + 1, col + 1))
-        return moves
+    def get_pawn_covers(self, game, piece, sq):
+        return attacks.PAWN[piece.side][sq]
     
-    def get_rook_covers(self, game, row, col):
-
-        moves = []
-        directions = [(0, 1), (0, -1), (1, 0), (-1, 0)]
-        
-        for dr, dc in directions:
-            for i in range(1, 8):
-                new_row, new_col = row + dr * i, col + dc * i
-                if not (0 <= new_row < 8 and 0 <= new_col < 8):
-                    break
-                target = game.board[new_row][new_col]
-                if target is None:
-                    moves.append((new_row, new_col))
-                elif target:
-                    moves.append((new_row, new_col))
-                    break
-                else:
-                    break
-        return moves
+    def get_rook_covers(self, game, piece, sq):
+        return attacks.rook_attacks(sq, game.bitboards.all)
     
-    def get_knight_covers(self, row, col):
-
-        moves = []
-        knight_moves = [
-            (2, 1), (2, -1), (-2, 1), (-2, -1),
-            (1, 2), (1, -2), (-1, 2), (-1, -2)
-        ]
-        
-        for dr, dc in knight_moves:
-            new_row, new_col = row + dr, col + dc
-            if 0 <= new_row < 8 and 0 <= new_col < 8:
-                moves.append((new_row, new_col))
-        return moves
+    def get_knight_covers(self, game, piece, sq):
+        return attacks.KNIGHT[sq]
     
-    def get_bishop_covers(self, game, row, col):
-
-        moves = []
-        directions = [(1, 1), (1, -1), (-1, 1), (-1, -1)]
-        
-        for dr, dc in directions:
-            for i in range(1, 8):
-                new_row, new_col = row + dr * i, col + dc * i
-                if not (0 <= new_row < 8 and 0 <= new_col < 8):
-                    break
-                target = game.board[new_row][new_col]
-                if target is None:
-                    moves.append((new_row, new_col))
-                elif target:
-                    moves.append((new_row, new_col))
-                    break
-                else:
-                    break
-        return moves
+    def get_bishop_covers(self, game, piece, sq):
+        return attacks.bishop_attacks(sq, game.bitboards.all)
     
-    def get_queen_covers(self, game, row, col):
-        return self.get_rook_covers(game, row, col) + \
-        self.get_bishop_covers(game, row, col)
+    def get_queen_covers(self, game, piece, sq):
+        return attacks.queen_attacks(sq, game.bitboards.all)
     
-    def get_king_covers(self, game, row, col):
+    def get_king_covers(self, game, piece, sq):
+        return attacks.KING[sq]
 
-        moves = []
-        directions = [
-            (0, 1), (0, -1), (1, 0), (-1, 0),
-            (1, 1), (1, -1), (-1, 1), (-1, -1)
-        ]
-        
-        for dr, dc in directions:
-            new_row, new_col = row + dr, col + dc
-            if 0 <= new_row < 8 and 0 <= new_col < 8:
-                target = game.board[new_row][new_col]
-                if target is None or target:
-                    moves.append((new_row, new_col))
-        return moves
+# AI.get_covering_moves by piece type code
+COVERS = (AI.get_pawn_covers, AI.get_knight_covers, AI.get_bishop_covers,
+          AI.get_rook_covers, AI.get_queen_covers, AI.get_king_covers)
 
 # Don't know how to checkmate in endgames.
 # Don't understand pieces behing others.
@@ -0,0 +1,924 @@
+#!/usr/bin/env python3
+
+# Pieces and game rules without any display, so positions can be built,
+# searched and played out headless. chess.py adds the window on top.
+
+from array import array
+
+import attackmap
+import attacks
+import bitboard
+import transposition
+import zobrist
+from bitboard import WHITE, BLACK, PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING
+
+# Deepest line of moves push can stack on a position
+MAX_PLY = 256
+# Room for the legal moves of any position, at most 218
+MAX_MOVES = 256
+
+# Castling rights left once a move starts or ends on a square: touching a
+# king or rook square loses the rights that piece takes part in
+CASTLING_KEPT = [15] * 64
+CASTLING_KEPT[60] = 15 & ~(zobrist.WHITE_KINGSIDE | zobrist.WHITE_QUEENSIDE)
+CASTLING_KEPT[63] = 15 & ~zobrist.WHITE_KINGSIDE
+CASTLING_KEPT[56] = 15 & ~zobrist.WHITE_QUEENSIDE
+CASTLING_KEPT[4] = 15 & ~(zobrist.BLACK_KINGSIDE | zobrist.BLACK_QUEENSIDE)
+CASTLING_KEPT[7] = 15 & ~zobrist.BLACK_KINGSIDE
+CASTLING_KEPT[0] = 15 & ~zobrist.BLACK_QUEENSIDE
+
+# Moves packed into 16 bits: from square << 6 | to square, the 12 bits of
+# transposition.encode_move, and a flag in the top four bits. Flags 1 to 4
+# are promotions and index PROMOTIONS, 0 is any other move.
+PROMOTIONS = (None, 'queen', 'rook', 'bishop', 'knight')
+PROMOTE_QUEEN = 1
+CASTLE = 5
+EN_PASSANT = 6
+DOUBLE_PUSH = 7
+
+# Kinds of moves ChessGame.generate_moves fills its buffer with
+CAPTURES = 1
+QUIETS = 2
+ALL_MOVES = CAPTURES | QUIETS
+
+# Back ranks, where pawns promote
+PROMOTION_SQUARES = 0xff | 0xff << 56
+
+
+def pack_move(from_sq, to_sq, flag=0):
+    return flag << 12 | from_sq << 6 | to_sq
+
+
+def promotion(move):
+    """Piece type a packed move promotes to, None if it is not a promotion"""
+    flag = move >> 12
+    return PROMOTIONS[flag] if flag < CASTLE else None
+
+
+# Pieces and rules work with the integer codes of colors and piece types;
+# the names stay available as Piece.color and Piece.type for code that deals
+# in names, like the renderer.
+COLOR_CODES = {color: code for code, color in enumerate(bitboard.COLORS)}
+TYPE_CODES = {piece_type: code for code, piece_type in enumerate(bitboard.PIECE_TYPES)}
+
+# Piece.value by type code
+VALUES = (1, 3, 3, 5, 9, 1)
+
+# Piece types counted in white_captured and black_captured, in display order
+CAPTURED_TYPES = ('pawn', 'knight', 'bishop', 'rook', 'queen')
+
+class Piece:
+
+    # Pieces hold their codes and square only, no image or other attributes
+    __slots__ = ('side', 'kind', 'position', 'has_moved')
+
+    def __init__(self, color, piece_type, position):
+        self.side = COLOR_CODES[color]
+        self.kind = TYPE_CODES[piece_type]
+        self.position = position
+        self.has_moved = False
+
+    @property
+    def color(self):
+        return bitboard.COLORS[self.side]
+
+    @property
+    def type(self):
+        return bitboard.PIECE_TYPES[self.kind]
+
+    @type.setter
+    def type(self, piece_type):
+        self.kind = TYPE_CODES[piece_type]
+
+    @property
+    def value(self):
+        return VALUES[self.kind]
+
+    @property
+    def code(self):
+        """Color and type in one small integer, never 0 (see ChessGame.codes)"""
+        return 1 + self.side * 6 + self.kind
+
+    def copy(self):
+        piece = Piece.__new__(Piece)
+        piece.side = self.side
+        piece.kind = self.kind
+        piece.position = self.position
+        piece.has_moved = self.has_moved
+        return piece
+    
+    def get_value(self):
+        return VALUES[self.kind]
+
+    def get_pseudo_legal_targets(self, bitboards):
+        """Target squares of the piece as a bitboard, without considering check"""
+        row, col = self.position
+        return self.generators[self.kind](self, bitboards, row * 8 + col)
+    
+    def _get_pawn_moves(self, bitboards, sq):
+        empty = ~bitboards.all & bitboard.FULL
+        pawn = 1 << sq
+        
+        # Move forward one square, and two squares on first move
+        if self.side == WHITE:
+            moves = pawn >> 8 & empty
+            if moves and not self.has_moved:
+                moves |= moves >> 8 & empty
+            enemies = bitboards.occupied[BLACK]
+        else:
+            moves = pawn << 8 & empty
+            if moves and not self.has_moved:
+                moves |= moves << 8 & empty
+            enemies = bitboards.occupied[WHITE]
+        
+        # Capture diagonally
+        return moves | attacks.PAWN[self.side][sq] & enemies
+    
+    def _get_rook_moves(self, bitboards, sq):
+        return attacks.rook_attacks(sq, bitboards.all) & ~bitboards.occupied[self.side]
+    
+    def _get_knight_moves(self, bitboards, sq):
+        return attacks.KNIGHT[sq] & ~bitboards.occupied[self.side]
+    
+    def _get_bishop_moves(self, bitboards, sq):
+        return attacks.bishop_attacks(sq, bitboards.all) & ~bitboards.occupied[self.side]
+    
+    def _get_queen_moves(self, bitboards, sq):
+        return attacks.queen_attacks(sq, bitboards.all) & ~bitboards.occupied[self.side]
+    
+    def _get_king_moves(self, bitboards, sq):
+        return attacks.KING[sq] & ~bitboards.occupied[self.side]
+
+    # Move generators by type code
+    generators = (_get_pawn_moves, _get_knight_moves, _get_bishop_moves,
+                  _get_rook_moves, _get_queen_moves, _get_king_moves)
+
+
+class ChessGame:
+
+    # Recompute the Zobrist hash from scratch after every move and assert it matches
+    debug_hash = False
+    # Whether put_piece and remove_piece keep attack_map up to date. A search
+    # that never reads it turns this off while it plays moves it takes back.
+    keep_attack_map = True
+
+    def __init__(self):
+        self.board = [[None for i in range(8)] for i in range(8)]
+        self.bitboards = bitboard.Bitboards()
+        self.attack_map = attackmap.AttackMap(self.bitboards)
+        self.hash = 0
+        self.castling_rights = 0
+        # Color code of the side to move, current_turn being its name
+        self.side_to_move = WHITE
+        self.game_over = False
+        self.winner = None
+        self.last_move = None
+        self._en_passant_target = None
+        self.promoting_pawn = None
+
+        self.turns = 1
+        self.blacks_value = self.get_value('black')
+        self.whitess_value = self.get_value('white')
+        self.color = 'white'
+        self.color_ai = 'black'
+        self.blacks = self.get_black_pieces()
+        
+        # NEW: Move history for undo functionality: the moves played, packed by
+        # pack_move with their flags, and the undo record of each in the layout of push
+        self.moves = array('H')
+        self.move_history = []
+        
+        # Undo records of the moves played with push, see pop
+        self.undo_stack = [None] * MAX_PLY
+        self.ply = 0
+        
+        # Check, mate and legal moves of the side to move, see get_status
+        self.status = None
+        
+        # NEW: Captured pieces tracking, as counts by piece type of what each side took
+        self.white_captured = dict.fromkeys(CAPTURED_TYPES, 0)
+        self.black_captured = dict.fromkeys(CAPTURED_TYPES, 0)
+        
+        self.setup_board()
+        self.bitboards.load(self.board)
+        self.attack_map.load(self.board)
+        # Piece.code of every square, 0 when empty, kept up to date with the board
+        self.codes = self.get_codes()
+        self.castling_rights = self.get_castling_rights()
+        self.hash = self.compute_hash()
+    
+    def copy(self):
+        """Independent copy of the position for a search to play moves on
+
+        The copy starts with an empty move history.
+        """
+        game = ChessGame.__new__(ChessGame)
+        game.__dict__.update(self.__dict__)
+        pieces = {}
+        game.board = [[None for i in range(8)] for i in range(8)]
+        for row in range(8):
+            for col in range(8):
+                piece = self.board[row][col]
+                if piece is not None:
+                    pieces[piece] = game.board[row][col] = piece.copy()
+        game.bitboards = bitboard.Bitboards()
+        game.bitboards.load(game.board)
+        game.attack_map = attackmap.AttackMap(game.bitboards)
+        game.attack_map.load(game.board)
+        game.codes = bytearray(self.codes)
+        game.promoting_pawn = pieces.get(self.promoting_pawn)
+        game.blacks = game.get_black_pieces()
+        game.moves = array('H')
+        game.move_history = []
+        game.undo_stack = [None] * MAX_PLY
+        game.ply = 0
+        game.status = None
+        game.white_captured = dict(self.white_captured)
+        game.black_captured = dict(self.black_captured)
+        return game
+
+    @property
+    def current_turn(self):
+        return bitboard.COLORS[self.side_to_move]
+
+    @current_turn.setter
+    def current_turn(self, color):
+        side = COLOR_CODES[color]
+        if side != self.side_to_move:
+            self.hash ^= zobrist.BLACK_TO_MOVE
+        self.side_to_move = side
+
+    @property
+    def en_passant_target(self):
+        return self._en_passant_target
+
+    @en_passant_target.setter
+    def en_passant_target(self, target):
+        if self._en_passant_target:
+            self.hash ^= zobrist.EN_PASSANT[self._en_passant_target[1]]
+        if target:
+            self.hash ^= zobrist.EN_PASSANT[target[1]]
+        self._en_passant_target = target
+
+    def get_castling_rights(self):
+        """Castling rights as zobrist flags, from the kings and rooks that have not moved"""
+        rights = 0
+        for side, row, kingside, queenside in ((WHITE, 7, zobrist.WHITE_KINGSIDE, zobrist.WHITE_QUEENSIDE),
+                                               (BLACK, 0, zobrist.BLACK_KINGSIDE, zobrist.BLACK_QUEENSIDE)):
+            king = self.board[row][4]
+            if not king or king.kind != KING or king.side != side or king.has_moved:
+                continue
+            for col, flag in ((7, kingside), (0, queenside)):
+                rook = self.board[row][col]
+                if rook and rook.kind == ROOK and rook.side == side and not rook.has_moved:
+                    rights |= flag
+        return rights
+
+    def update_castling_rights(self):
+        rights = self.get_castling_rights()
+        if rights != self.castling_rights:
+            self.hash ^= zobrist.CASTLING[self.castling_rights] ^ zobrist.CASTLING[rights]
+            self.castling_rights = rights
+
+    def compute_hash(self):
+        """Zobrist hash of the position, computed from scratch"""
+        return zobrist.compute(self.board, self.current_turn, self.castling_rights, self.en_passant_target)
+
+    def sync_hash(self):
+        """Fold castling rights into the hash after a move, and verify it when debug_hash is on"""
+        self.update_castling_rights()
+        if self.debug_hash:
+            assert self.hash == self.compute_hash(), "Zobrist hash out of sync"
+    
+    def setup_board(self):
+        """Initialize the chess board with pieces"""
+        # Pawns
+        for col in range(8):
+            self.board[1][col] = Piece('black', 'pawn', (1, col))
+            self.board[6][col] = Piece('white', 'pawn', (6, col))
+        
+        # Rooks
+        self.board[0][0] = Piece('black', 'rook', (0, 0))
+        self.board[0][7] = Piece('black', 'rook', (0, 7))
+        self.board[7][0] = Piece('white', 'rook', (7, 0))
+        self.board[7][7] = Piece('white', 'rook', (7, 7))
+        
+        # Knights
+        self.board[0][1] = Piece('black', 'knight', (0, 1))
+        self.board[0][6] = Piece('black', 'knight', (0, 6))
+        self.board[7][1] = Piece('white', 'knight', (7, 1))
+        self.board[7][6] = Piece('white', 'knight', (7, 6))
+        
+        # Bishops
+        self.board[0][2] = Piece('black', 'bishop', (0, 2))
+        self.board[0][5] = Piece('black', 'bishop', (0, 5))
+        self.board[7][2] = Piece('white', 'bishop', (7, 2))
+        self.board[7][5] = Piece('white', 'bishop', (7, 5))
+        
+        # Queens
+        self.board[0][3] = Piece('black', 'queen', (0, 3))
+        self.board[7][3] = Piece('white', 'queen', (7, 3))
+        
+        # Kings
+        self.board[0][4] = Piece('black', 'king', (0, 4))
+        self.board[7][4] = Piece('white', 'king', (7, 4))
+    
+    def get_codes(self):
+        """The board as a bytearray of Piece.code by square, 0 for empty squares"""
+        return bytearray(piece.code if piece else 0 for row in self.board for piece in row)
+
+    def get_value(self, color):
+
+        value = 0
+        if color == 'black':
+            team = self.get_black_pieces()
+        else:
+            team = self.get_white_pieces()
+        for piece in team:
+            value += piece.value
+        return value
+
+    def get_white_pieces(self):
+        return self.get_pieces('white')
+
+    def get_black_pieces(self):
+        return self.get_pieces('black')
+
+    def get_pieces(self, color):
+        """Pieces of the given color, in board order"""
+        return self.get_side_pieces(COLOR_CODES[color])
+
+    def get_side_pieces(self, side):
+        """get_pieces for a color code"""
+        board = self.board
+        return [board[sq >> 3][sq & 7] for sq in bitboard.squares(self.bitboards.occupied[side])]
+
+    def put_piece(self, piece, pos):
+        """Place a piece on a square, keeping the bitboards and attack map in sync"""
+        row, col = pos
+        self.remove_piece(pos)
+        self.board[row][col] = piece
+        self.codes[row * 8 + col] = piece.code
+        self.bitboards.add(piece.side, piece.kind, row * 8 + col)
+        if self.keep_attack_map:
+            self.attack_map.add(piece, row * 8 + col)
+        self.hash ^= zobrist.PIECE_KEYS[piece.side][piece.kind][row * 8 + col]
+
+    def remove_piece(self, pos):
+        """Empty a square and return what was on it"""
+        row, col = pos
+        piece = self.board[row][col]
+        if piece is not None:
+            self.board[row][col] = None
+            self.codes[row * 8 + col] = 0
+            self.bitboards.remove(piece.side, piece.kind, row * 8 + col)
+            if self.keep_attack_map:
+                self.attack_map.remove(row * 8 + col)
+            self.hash ^= zobrist.PIECE_KEYS[piece.side][piece.kind][row * 8 + col]
+        return piece
+
+    def move_piece(self, piece, new_pos):
+        """Move a piece to a square and return the piece it replaced"""
+        self.remove_piece(piece.position)
+        captured = self.remove_piece(new_pos)
+        self.put_piece(piece, new_pos)
+        piece.position = new_pos
+        return captured
+
+    def find_king(self, color):
+        """Find the king's position"""
+        kings = self.bitboards.pieces[COLOR_CODES[color]][KING]
+        if not kings:
+            return None
+        return bitboard.coords(bitboard.lsb(kings))
+    
+    def is_square_attacked(self, position, by_color):
+        """Check if a square is attacked by a given color"""
+        # Looks outward from the square for a piece of by_color that has it
+        # among its pseudo legal moves, so pawns count when they could push
+        # onto an empty square and only capture onto an enemy piece.
+        row, col = position
+        sq = row * 8 + col
+        target = 1 << sq
+        bitboards = self.bitboards
+        by_side = COLOR_CODES[by_color]
+        if bitboards.occupied[by_side] & target:
+            return False
+        pieces = bitboards.pieces[by_side]
+        
+        if attacks.KNIGHT[sq] & pieces[KNIGHT] or attacks.KING[sq] & pieces[KING]:
+            return True
+        
+        # Pawns
+        pawns = pieces[PAWN]
+        if pawns:
+            if bitboards.all & target:
+                if attacks.PAWN[by_side ^ 1][sq] & pawns:
+                    return True
+            else:
+                behind = 8 if by_side == WHITE else -8
+                if 0 <= sq + behind < 64 and pawns >> (sq + behind) & 1:
+                    return True
+                start = sq + 2 * behind
+                if 0 <= start < 64 and pawns >> start & 1 and not bitboards.all >> (sq + behind) & 1:
+                    if not self.board[start >> 3][start & 7].has_moved:
+                        return True
+        
+        # Sliders
+        queens = pieces[QUEEN]
+        if (pieces[ROOK] | queens) and attacks.rook_attacks(sq, bitboards.all) & (pieces[ROOK] | queens):
+            return True
+        if (pieces[BISHOP] | queens) and attacks.bishop_attacks(sq, bitboards.all) & (pieces[BISHOP] | queens):
+            return True
+        return False
+    
+    def is_in_check(self, color):
+        """Check if the king of the given color is in check"""
+        king_pos = self.find_king(color)
+        if not king_pos:
+            return False
+        
+        opponent_color = 'black' if color == 'white' else 'white'
+        return self.is_square_attacked(king_pos, opponent_color)
+    
+    def attackers_to(self, sq, by_side, occupied):
+        """Bitboard of the pieces of a side, by color code, attacking a square for a given occupancy"""
+        pieces = self.bitboards.pieces[by_side]
+        queens = pieces[QUEEN]
+        return (attacks.KNIGHT[sq] & pieces[KNIGHT] |
+                attacks.KING[sq] & pieces[KING] |
+                attacks.PAWN[by_side ^ 1][sq] & pieces[PAWN] |
+                attacks.rook_attacks(sq, occupied) & (pieces[ROOK] | queens) |
+                attacks.bishop_attacks(sq, occupied) & (pieces[BISHOP] | queens))
+    
+    def get_legal_context(self, side):
+        """Checkers and pins of a side, by color code, shared by all of its legal move lookups"""
+        bitboards = self.bitboards
+        kings = bitboards.pieces[side][KING]
+        if not kings:
+            return None
+        
+        king_sq = bitboard.lsb(kings)
+        enemy = side ^ 1
+        occupied = bitboards.all
+        checkers = self.attackers_to(king_sq, enemy, occupied)
+        
+        # Moves of other pieces must capture the checker or block it
+        if not checkers:
+            check_mask = bitboard.FULL
+        elif checkers & (checkers - 1):
+            check_mask = 0
+        else:
+            check_mask = checkers | attacks.BETWEEN[king_sq][bitboard.lsb(checkers)]
+        
+        # A piece alone between the king and an enemy slider can only move along that line
+        pins = {}
+        pieces = bitboards.pieces[enemy]
+        snipers = (attacks.rook_attacks(king_sq, 0) & (pieces[ROOK] | pieces[QUEEN]) |
+                   attacks.bishop_attacks(king_sq, 0) & (pieces[BISHOP] | pieces[QUEEN]))
+        for sniper in bitboard.squares(snipers):
+            blockers = attacks.BETWEEN[king_sq][sniper] & occupied
+            if blockers and not blockers & (blockers - 1) and blockers & bitboards.occupied[side]:
+                pins[bitboard.lsb(blockers)] = attacks.LINE[king_sq][sniper]
+        
+        return (king_sq, checkers, check_mask, pins)
+    
+    def get_legal_moves(self, piece, context=False):
+        """Get all legal moves (excluding moves that would leave king in check)"""
+        if context is False:
+            context = self.get_legal_context(piece.side)
+        legal_moves = bitboard.to_moves(self.get_legal_targets(piece, context))
+        
+        # Add castling for king
+        if piece.kind == KING:
+            legal_moves.extend(self.get_castling_moves(piece, context))
+        
+        # Add en passant for pawns
+        if piece.kind == PAWN:
+            for move in self.get_en_passant_moves(piece):
+                if self.is_en_passant_legal(piece, move, context):
+                    legal_moves.append(move)
+        
+        return legal_moves
+
+    def get_legal_targets(self, piece, context):
+        """Legal moves of a piece as a bitboard, without castling and en passant"""
+        row, col = piece.position
+        sq = row * 8 + col
+        targets = piece.get_pseudo_legal_targets(self.bitboards)
+        
+        if context is not None:
+            king_sq, checkers, check_mask, pins = context
+            if piece.kind == KING:
+                # The king may not step onto a square its own body was shielding
+                enemy = piece.side ^ 1
+                occupied = self.bitboards.all ^ (1 << sq)
+                for target in bitboard.squares(targets):
+                    if self.attackers_to(target, enemy, occupied):
+                        targets ^= 1 << target
+            else:
+                targets &= check_mask
+                if sq in pins:
+                    targets &= pins[sq]
+        return targets
+
+    def generate_moves(self, buffer, context=False, kinds=ALL_MOVES):
+        """Write the legal moves of the side to move, packed by pack_move with
+        promotions being to a queen, from the start of buffer, an array('H') of
+        at least MAX_MOVES entries. kinds picks CAPTURES, which take promotions
+        along, QUIETS or both. Returns how many moves were written."""
+        if context is False:
+            context = self.get_legal_context(self.side_to_move)
+        enemies = self.bitboards.occupied[self.side_to_move ^ 1]
+        if kinds == CAPTURES:
+            wanted = enemies
+        elif kinds == QUIETS:
+            wanted = ~enemies
+        else:
+            wanted = bitboard.FULL
+        count = 0
+        for piece in self.get_side_pieces(self.side_to_move):
+            row, col = piece.position
+            from_sq = row * 8 + col
+            base = from_sq << 6
+            targets = self.get_legal_targets(piece, context)
+            if piece.kind == PAWN:
+                if kinds == CAPTURES:
+                    targets &= enemies | PROMOTION_SQUARES
+                elif kinds == QUIETS:
+                    targets &= ~(enemies | PROMOTION_SQUARES)
+                while targets:
+                    low = targets & -targets
+                    to_sq = low.bit_length() - 1
+                    targets ^= low
+                    if to_sq < 8 or to_sq >= 56:
+                        flag = PROMOTE_QUEEN << 12
+                    elif to_sq - from_sq == 16 or from_sq - to_sq == 16:
+                        flag = DOUBLE_PUSH << 12
+                    else:
+                        flag = 0
+                    buffer[count] = flag | base | to_sq
+                    count += 1
+                if kinds & CAPTURES:
+                    for move in self.get_en_passant_moves(piece):
+                        if self.is_en_passant_legal(piece, move, context):
+                            buffer[count] = EN_PASSANT << 12 | base | move[0] * 8 + move[1]
+                            count += 1
+                continue
+            targets &= wanted
+            while targets:
+                low = targets & -targets
+                buffer[count] = base | low.bit_length() - 1
+                count += 1
+                targets ^= low
+            if piece.kind == KING and kinds & QUIETS:
+                for move in self.get_castling_moves(piece, context):
+                    buffer[count] = CASTLE << 12 | base | move[0] * 8 + move[1]
+                    count += 1
+        return count
+
+    def legal_move(self, move, context):
+        """A move packed without its flag, like a table move, with its flag put
+        back if it is legal for the side to move, 0 otherwise"""
+        from_sq, to_sq = move >> 6 & 63, move & 63
+        piece = self.board[from_sq >> 3][from_sq & 7]
+        if piece is None or piece.side != self.side_to_move:
+            return 0
+        base = from_sq << 6 | to_sq
+        if self.get_legal_targets(piece, context) >> to_sq & 1:
+            if piece.kind != PAWN:
+                return base
+            if to_sq < 8 or to_sq >= 56:
+                return PROMOTE_QUEEN << 12 | base
+            return DOUBLE_PUSH << 12 | base if abs(to_sq - from_sq) == 16 else base
+        to = bitboard.COORDS[to_sq]
+        if piece.kind == KING and to in self.get_castling_moves(piece, context):
+            return CASTLE << 12 | base
+        if piece.kind == PAWN and to in self.get_en_passant_moves(piece) and \
+                self.is_en_passant_legal(piece, to, context):
+            return EN_PASSANT << 12 | base
+        return 0
+
+    def get_all_legal_moves(self, color):
+        """Legal moves of every piece of a color, as a {piece: moves} dict in board order"""
+        context = self.get_legal_context(COLOR_CODES[color])
+        return {piece: self.get_legal_moves(piece, context) for piece in self.get_pieces(color)}
+    
+    def has_legal_moves(self, color):
+        context = self.get_legal_context(COLOR_CODES[color])
+        for piece in self.get_pieces(color):
+            if self.get_legal_moves(piece, context):
+                return True
+        return False
+    
+    def get_castling_moves(self, king, context=False):
+        """Get castling moves for the king"""
+        if context is False:
+            context = self.get_legal_context(king.side)
+        if king.has_moved or context is None or context[1]:
+            return []
+        
+        moves = []
+        row, col = king.position
+        enemy = king.side ^ 1
+        occupied = self.bitboards.all ^ (1 << (row * 8 + col))
+        
+        # Kingside castling
+        rook = self.board[row][7]
+        if rook and rook.kind == ROOK and not rook.has_moved:
+            if not attacks.BETWEEN[row * 8 + col][row * 8 + 7] & self.bitboards.all:
+                # Check that king doesn't move through or into check
+                if not self.attackers_to(row * 8 + col + 1, enemy, occupied) and \
+                not self.attackers_to(row * 8 + col + 2, enemy, occupied):
+                    moves.append((row, col + 2))
+        
+        # Queenside castling
+        rook = self.board[row][0]
+        if rook and rook.kind == ROOK and not rook.has_moved:
+            if not attacks.BETWEEN[row * 8 + col][row * 8] & self.bitboards.all:
+                # Check that king doesn't move through or into check
+                if not self.attackers_to(row * 8 + col - 1, enemy, occupied) and \
+                not self.attackers_to(row * 8 + col - 2, enemy, occupied):
+                    moves.append((row, col - 2))
+        
+        return moves
+    
+    def is_en_passant_legal(self, pawn, move, context):
+        """En passant removes two pawns from the board at once, so replay it on the occupancy"""
+        row, col = pawn.position
+        captured = 1 << (row * 8 + move[1])
+        enemy = pawn.side ^ 1
+        if not self.bitboards.pieces[enemy][PAWN] & captured:
+            return False
+        if context is None:
+            return True
+        occupied = self.bitboards.all ^ (1 << (row * 8 + col)) ^ captured | 1 << (move[0] * 8 + move[1])
+        return not self.attackers_to(context[0], enemy, occupied) & ~captured
+    
+    def get_en_passant_moves(self, pawn):
+        """Get en passant moves for a pawn"""
+        if not self.en_passant_target:
+            return []
+        
+        row, col = pawn.position
+        target_row, target_col = self.en_passant_target
+        direction = -1 if pawn.side == WHITE else 1
+        
+        # Check if pawn is in correct position for en passant
+        if row + direction == target_row and abs(col - target_col) == 1:
+            return [(target_row, target_col)]
+        
+        return []
+    
+    def get_status(self):
+        """Check, checkmate, stalemate and legal moves of the side to move
+
+        Computed once per position: make_move, promote and undoing a move
+        clear it.
+        """
+        if self.status is None or self.status['color'] != self.current_turn:
+            color = self.current_turn
+            context = self.get_legal_context(self.side_to_move)
+            legal_moves = {piece: self.get_legal_moves(piece, context) for piece in self.get_pieces(color)}
+            in_check = context is not None and context[1] != 0
+            has_moves = any(legal_moves.values())
+            self.status = {
+                'color': color,
+                'in_check': in_check,
+                'checkmate': in_check and not has_moves,
+                'stalemate': not in_check and not has_moves,
+                'legal_moves': legal_moves,
+            }
+        return self.status
+
+    def check_if_game_is_over(self):
+
+        status = self.get_status()
+        if status['checkmate']:
+            self.winner = 'black' if status['color'] == 'white' else 'white'
+            self.game_over = True
+        elif status['stalemate']:
+            self.winner = 'nobody'
+            self.game_over = True
+    
+    def make_move(self, piece, new_pos):
+        """Make a move and handle special moves"""
+        old_pos = piece.position
+        old_row, old_col = old_pos
+        new_row, new_col = new_pos
+        captured = self.board[new_row][new_col]
+        captured_pos = new_pos
+        rook = None
+        if piece.kind == PAWN and self.en_passant_target == new_pos:
+            captured_pos = (old_row, new_col)
+            captured = self.board[old_row][new_col]
+        elif piece.kind == KING and abs(new_col - old_col) == 2:
+            rook = self.board[old_row][7 if new_col > old_col else 0]
+        promoted = piece.kind == PAWN and (new_row == 0 or new_row == 7)
+        
+        if rook:
+            flag = CASTLE
+        elif captured_pos != new_pos:
+            flag = EN_PASSANT
+        elif piece.kind == PAWN and abs(new_row - old_row) == 2:
+            flag = DOUBLE_PUSH
+        else:
+            flag = 0
+        
+        # NEW: Save move state for undo
+        self.moves.append(pack_move(old_row * 8 + old_col, new_row * 8 + new_col, flag))
+        self.move_history.append((piece, old_pos, captured, captured_pos, piece.has_moved, rook, promoted,
+                                  self.side_to_move, self.en_passant_target, self.castling_rights, self.hash,
+                                  self.status))
+        self.status = None
+
+        # Handle castling
+        if rook:
+            self.move_piece(rook, (old_row, (old_col + new_col) // 2))
+            rook.has_moved = True
+        
+        # Handle captures, en passant included
+        if captured:
+            self.remove_piece(captured_pos)
+            
+            # NEW: Track captured piece
+            if piece.side == WHITE:
+                self.white_captured[captured.type] += 1
+            else:
+                self.black_captured[captured.type] += 1
+        
+        # Move the piece
+        self.move_piece(piece, new_pos)
+        
+        # Set en passant target
+        if piece.kind == PAWN and abs(new_row - old_row) == 2:
+            direction = -1 if piece.side == WHITE else 1
+            self.en_passant_target = (old_row + direction, old_col)
+        else:
+            self.en_passant_target = None
+        
+        piece.has_moved = True
+        self.last_move = (old_pos, new_pos)
+        
+        # Check for pawn promotion
+        if promoted:
+            if piece.color == self.color:
+                self.promoting_pawn = piece
+                self.sync_hash()
+                return
+            else:
+                self.put_piece(Piece(self.color_ai, 'queen', (new_row, new_col)), new_pos)
+                self.moves[-1] |= PROMOTE_QUEEN << 12
+
+        # Switch turn
+        if not self.game_over:
+            self.current_turn = 'black' if self.current_turn == 'white' else 'white'
+            self.turns += 1
+        self.sync_hash()
+    
+    def can_undo(self):
+        return bool(self.move_history) and self.current_turn == 'white' and not self.game_over \
+            and not self.promoting_pawn
+
+    # NEW: Undo functionality
+    def undo_move(self):
+        """Undo the last move"""
+        if not self.move_history or self.game_over:
+            return
+        
+        # Only allow undo on player's turn and when not promoting
+        if self.current_turn != 'white' or self.promoting_pawn:
+            return
+        
+        # Pop the last move (player's move)
+        if len(self.move_history) < 1:
+            return
+        
+        # Undo AI's move first if it exists
+        if len(self.move_history) >= 2:
+            self._undo_single_move()
+        
+        # Undo player's move
+        self._undo_single_move()
+        
+        self.current_turn = 'white'
+        self.turns = max(1, self.turns - 2)
+    
+    def _undo_single_move(self):
+        """Take back the last move of move_history"""
+        record = self.move_history.pop()
+        self.moves.pop()
+        piece, captured = record[0], record[2]
+        
+        # Remove from captured counts
+        if captured:
+            if piece.side == WHITE:
+                self.white_captured[captured.type] -= 1
+            else:
+                self.black_captured[captured.type] -= 1
+        
+        self._restore(record)
+        self.last_move = transposition.decode_move(self.moves[-1] & 0xfff) if self.moves else None
+
+    def push(self, piece, new_pos):
+        """Play a move inside a search, take it back with pop
+
+        Castling, en passant and promotion (always to a queen) are played in
+        full, but move_history, the captured counts and the move counters are
+        left alone. The undo record goes to a slot of undo_stack.
+        """
+        old_pos = piece.position
+        old_row, old_col = old_pos
+        new_row, new_col = new_pos
+        pawn = piece.kind == PAWN
+        captured = self.board[new_row][new_col]
+        captured_pos = new_pos
+        rook = None
+        key = self.hash
+        
+        if pawn and new_pos == self._en_passant_target:
+            captured_pos = (old_row, new_col)
+            captured = self.remove_piece(captured_pos)
+        elif piece.kind == KING and abs(new_col - old_col) == 2:
+            rook = self.board[old_row][7 if new_col > old_col else 0]
+            self.move_piece(rook, (old_row, (old_col + new_col) // 2))
+            rook.has_moved = True
+        
+        promoted = pawn and (new_row == 0 or new_row == 7)
+        self.undo_stack[self.ply] = (piece, old_pos, captured, captured_pos, piece.has_moved, rook, promoted,
+                                     self.side_to_move, self._en_passant_target, self.castling_rights, key,
+                                     self.status)
+        self.ply += 1
+        self.status = None
+        self.move_piece(piece, new_pos)
+        piece.has_moved = True
+        if promoted:
+            self.remove_piece(new_pos)
+            piece.kind = QUEEN
+            self.put_piece(piece, new_pos)
+        
+        if pawn and abs(new_row - old_row) == 2:
+            self.en_passant_target = ((old_row + new_row) // 2, old_col)
+        else:
+            self.en_passant_target = None
+        rights = self.castling_rights & CASTLING_KEPT[old_row * 8 + old_col] & CASTLING_KEPT[new_row * 8 + new_col]
+        if rights != self.castling_rights:
+            self.hash ^= zobrist.CASTLING[self.castling_rights] ^ zobrist.CASTLING[rights]
+            self.castling_rights = rights
+        if self.side_to_move == piece.side:
+            self.hash ^= zobrist.BLACK_TO_MOVE
+            self.side_to_move ^= 1
+        if self.debug_hash:
+            assert self.hash == self.compute_hash(), "Zobrist hash out of sync"
+
+    def push_move(self, move):
+        """push for a move packed by pack_move"""
+        from_sq = move >> 6 & 63
+        self.push(self.board[from_sq >> 3][from_sq & 7], bitboard.COORDS[move & 63])
+
+    def pop(self):
+        """Take back the last move played with push"""
+        self.ply -= 1
+        self._restore(self.undo_stack[self.ply])
+
+    def _restore(self, record):
+        """Put back the position an undo record was taken in"""
+        (piece, old_pos, captured, captured_pos, had_moved, rook, promoted,
+         turn, en_passant_target, castling_rights, hash, status) = record
+        new_pos = piece.position
+        
+        self.remove_piece(new_pos)
+        if promoted:
+            piece.kind = PAWN
+        self.put_piece(piece, old_pos)
+        piece.position = old_pos
+        piece.has_moved = had_moved
+        if captured:
+            self.put_piece(captured, captured_pos)
+        if rook:
+            self.move_piece(rook, (old_pos[0], 7 if new_pos[1] > old_pos[1] else 0))
+            rook.has_moved = False
+        
+        # Turn, en passant square and castling rights are already in the saved hash
+        self.side_to_move = turn
+        self._en_passant_target = en_passant_target
+        self.castling_rights = castling_rights
+        self.hash = hash
+        self.status = status
+    
+    def promote(self, piece_type):
+        """Finish the player's promotion waiting in promoting_pawn"""
+        self.status = None
+        self.remove_piece(self.promoting_pawn.position)
+        self.promoting_pawn.kind = TYPE_CODES[piece_type]
+        self.put_piece(self.promoting_pawn, self.promoting_pawn.position)
+        
+        # NEW: Update the last move in history with promotion info
+        if self.moves:
+            self.moves[-1] |= PROMOTIONS.index(piece_type) << 12
+        
+        self.promoting_pawn = None
+        
+        # Switch turn
+        self.current_turn = 'black' if self.current_turn == 'white' else 'white'
+        self.sync_hash()
@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+
+# Magic bitboards for sliding pieces. The squares that can block a rook or
+# bishop on sq form its mask; multiplying the blockers inside the mask by the
+# square's magic number and keeping the top bits gives a perfect index into a
+# per-square attack table.
+#
+# Finding the magic numbers is slow, so it is done once with
+#     python magic.py
+# which writes them to magics.bin (64 rook then 64 bishop magics, as
+# little-endian 64-bit integers). attacks.py loads that file and fills the
+# attack tables at import.
+
+import os
+import random
+import struct
+import sys
+
+from bitboard import BISHOP_DIRECTIONS, FULL, ROOK_DIRECTIONS, popcount, slide
+
+MAGICS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'magics.bin')
+MAGICS_FORMAT = '<128Q'
+
+
+def relevant_mask(sq, directions):
+    """Squares whose occupancy changes the attacks from sq, board edges excluded"""
+    mask = 0
+    row, col = sq >> 3, sq & 7
+    for dr, dc in directions:
+        r, c = row + dr, col + dc
+        while 0 <= r + dr < 8 and 0 <= c + dc < 8:
+            mask |= 1 << (r * 8 + c)
+            r, c = r + dr, c + dc
+    return mask
+
+
+def subsets(mask):
+    """Every subset of mask, starting with the empty one"""
+    subset = 0
+    while True:
+        yield subset
+        subset = (subset - mask) & mask
+        if not subset:
+            return
+
+
+def fill(sq, mask, magic, attack_function):
+    """Attack table of one square, indexed by its magic"""
+    shift = 64 - popcount(mask)
+    table = [0] * (1 << (64 - shift))
+    for blockers in subsets(mask):
+        table[(blockers * magic & FULL) >> shift] = attack_function(sq, blockers)
+    return table
+
+
+def find_magic(sq, directions, rng):
+    """Try random sparse numbers until one indexes every blocker set of sq without collision"""
+    mask = relevant_mask(sq, directions)
+    bits = popcount(mask)
+    shift = 64 - bits
+    blockers = list(subsets(mask))
+    attacks = [slide(sq, occupied, directions) for occupied in blockers]
+
+    while True:
+        magic = rng.getrandbits(64) & rng.getrandbits(64) & rng.getrandbits(64)
+        # Numbers that spread few mask bits into the top byte never work
+        if popcount((mask * magic & FULL) >> 56) < 6:
+            continue
+        used = [None] * (1 << bits)
+        for occupied, attack in zip(blockers, attacks):
+            index = (occupied * magic & FULL) >> shift
+            if used[index] is None:
+                used[index] = attack
+            elif used[index] != attack:
+                break
+        else:
+            return magic
+
+
+def generate(seed=0):
+    """Find the rook and bishop magic numbers of every square"""
+    rng = random.Random(seed)
+    rook = [find_magic(sq, ROOK_DIRECTIONS, rng) for sq in range(64)]
+    bishop = [find_magic(sq, BISHOP_DIRECTIONS, rng) for sq in range(64)]
+    return rook, bishop
+
+
+def save(rook, bishop, path=MAGICS_FILE):
+    with open(path, 'wb') as f:
+        f.write(struct.pack(MAGICS_FORMAT, *rook, *bishop))
+
+
+def load(path=MAGICS_FILE):
+    """Read the rook and bishop magics written by save"""
+    with open(path, 'rb') as f:
+        magics = struct.unpack(MAGICS_FORMAT, f.read())
+    return list(magics[:64]), list(magics[64:])
+
+
+def main():
+    seed = int(sys.argv[1]) if len(sys.argv) > 1 else 0
+    rook, bishop = generate(seed)
+    save(rook, bishop)
+    print(f"Wrote {len(rook) + len(bishop)} magics to {MAGICS_FILE}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,334 @@
+#!/usr/bin/env python3
+
+import pygame
+
+from sprites import SpriteAtlas
+
+SQUARE_SIZE = 80
+PIECE_WIDTH = 45
+PIECE_HEIGHT = 75
+CAPTURED_SIZE = 50
+
+PROMOTION_CHOICES = ['queen', 'rook', 'bishop', 'knight']
+CHOICE_WIDTH = 80
+CHOICE_HEIGHT = 80
+
+# Sizes pieces are drawn at: on the board, in the captured lists and in the promotion dialog
+SPRITE_SIZES = {
+    'board': (PIECE_WIDTH, PIECE_HEIGHT),
+    'captured': (CAPTURED_SIZE - 5, CAPTURED_SIZE + 10),
+    'promotion': (60, 70),
+}
+
+
+class Renderer:
+
+    """Owns the window and every surface, and draws a core.ChessGame into it"""
+
+    def __init__(self):
+        pygame.init()
+        info = pygame.display.Info()
+        self.screen = pygame.display.set_mode((info.current_w, info.current_h))
+        pygame.display.set_caption("Chess Game")
+
+        self.sprites = SpriteAtlas(SPRITE_SIZES)
+        self.fonts = {}
+        # Window background with the empty board, by resolution
+        self.backgrounds = {}
+        self.set_resolution(info.current_w, info.current_h)
+
+        # NEW: Undo button rect
+        self.undo_button_rect = None
+
+    def set_resolution(self, width, height):
+        self.screen_width = width
+        self.screen_height = height
+        self.board_offset_x = (self.screen_width - SQUARE_SIZE * 8) // 2
+        self.board_offset_y = (self.screen_height - SQUARE_SIZE * 8) // 2
+        if (width, height) not in self.backgrounds:
+            self.backgrounds[width, height] = self.render_background()
+        self.background = self.backgrounds[width, height]
+        self.invalidate()
+
+    def invalidate(self):
+        """Push the whole window on the next draw, e.g. after it was uncovered"""
+        self.shown = None
+
+    def font(self, size):
+        if size not in self.fonts:
+            self.fonts[size] = pygame.font.Font(None, size)
+        return self.fonts[size]
+
+    def render_background(self):
+        """Draw the static layer: the window background and the board squares"""
+        background = pygame.Surface((self.screen_width, self.screen_height))
+        background.fill((40, 40, 40))
+
+        # Draw squares
+        colors = [(240, 217, 181), (181, 136, 99)]
+        for row in range(8):
+            for col in range(8):
+                pygame.draw.rect(background, colors[(row + col) % 2], self.square_rect(row, col))
+        return background
+
+    def square_rect(self, row, col):
+        return pygame.Rect(
+            self.board_offset_x + col * SQUARE_SIZE,
+            self.board_offset_y + row * SQUARE_SIZE,
+            SQUARE_SIZE,
+            SQUARE_SIZE
+        )
+
+    def banner_rect(self):
+        """Strip above the board holding the turn indicator or game over message"""
+        return pygame.Rect(0, self.board_offset_y - 100, self.screen_width, 100)
+
+    def captured_rect(self):
+        """Side panel left of the board with the player value and captured pieces"""
+        return pygame.Rect(0, 0, self.board_offset_x, self.screen_height)
+
+    def get_undo_button_rect(self):
+        button_width = 120
+        button_height = 40
+        button_x = self.screen_width // 2 - button_width // 2
+        button_y = self.board_offset_y
+        return pygame.Rect(button_x + 500, button_y, button_width, button_height)
+
+    def get_dialog_rect(self):
+        dialog_width = len(PROMOTION_CHOICES) * CHOICE_WIDTH + 40
+        dialog_height = CHOICE_HEIGHT + 60
+        dialog_x = self.screen_width // 2 - dialog_width // 2
+        dialog_y = self.screen_height // 2 - dialog_height // 2
+        return pygame.Rect(dialog_x, dialog_y, dialog_width, dialog_height)
+
+    def get_state(self, game):
+        """Everything drawn, grouped by the window region it shows up in"""
+        in_check = game.get_status()['in_check']
+        king_pos = game.find_king(game.current_turn) if in_check else None
+        selected = game.selected_piece.position if game.selected_piece and not game.game_over else None
+        valid_moves = set(game.valid_moves)
+        squares = []
+        for row in range(8):
+            for col in range(8):
+                squares.append((game.codes[row * 8 + col],
+                                (row, col) == king_pos,
+                                (row, col) == selected,
+                                (row, col) in valid_moves))
+        return {
+            'squares': squares,
+            'banner': (game.game_over, game.winner, game.color, game.current_turn, in_check),
+            'captured': (game.color, game.get_value('white') - game.get_value('black'),
+                         tuple(game.white_captured.values()), tuple(game.black_captured.values())),
+            'undo': game.can_undo(),
+            'promotion': game.promoting_pawn.color if game.promoting_pawn else None,
+        }
+
+    def get_dirty_rects(self, state):
+        """Regions of the window that differ from what was last pushed to it"""
+        shown = self.shown
+        rects = []
+        for sq, square in enumerate(state['squares']):
+            if square != shown['squares'][sq]:
+                rects.append(self.square_rect(sq // 8, sq % 8))
+        if state['banner'] != shown['banner']:
+            rects.append(self.banner_rect())
+        if state['captured'] != shown['captured']:
+            rects.append(self.captured_rect())
+        if state['undo'] != shown['undo']:
+            rects.append(self.get_undo_button_rect())
+        if state['promotion'] != shown['promotion']:
+            rects.append(self.get_dialog_rect())
+        return rects
+
+    def get_square_from_pos(self, pos):
+        """Convert pixel position to board coordinates"""
+        x, y = pos
+        col = (x - self.board_offset_x) // SQUARE_SIZE
+        row = (y - self.board_offset_y) // SQUARE_SIZE
+
+        if 0 <= row < 8 and 0 <= col < 8:
+            return (row, col)
+        return None
+
+    def get_promotion_choice(self, pos):
+        """Piece type of the promotion choice under pos, or None"""
+        start_x = self.screen_width // 2 - (len(PROMOTION_CHOICES) * CHOICE_WIDTH) // 2
+        start_y = self.screen_height // 2 - CHOICE_HEIGHT // 2
+
+        x, y = pos
+        if start_y <= y <= start_y + CHOICE_HEIGHT:
+            for i, piece_type in enumerate(PROMOTION_CHOICES):
+                choice_x = start_x + i * CHOICE_WIDTH
+                if choice_x <= x <= choice_x + CHOICE_WIDTH:
+                    return piece_type
+        return None
+
+    def draw(self, game):
+        """Draw the chess board and pieces, pushing only the regions that changed"""
+        game.check_if_game_is_over()
+        state = self.get_state(game)
+        if state == self.shown:
+            return
+
+        self.screen.blit(self.background, (0, 0))
+
+        for sq, (piece, in_check, selected, valid_move) in enumerate(state['squares']):
+            row, col = sq // 8, sq % 8
+            # Highlight if king is in check
+            if in_check:
+                pygame.draw.rect(self.screen, (255, 0, 0), self.square_rect(row, col), 5)
+
+            # Highlight selected piece
+            if selected:
+                pygame.draw.rect(self.screen, (255, 255, 0), self.square_rect(row, col), 4)
+
+            # Highlight valid moves
+            if valid_move:
+                center_x = self.board_offset_x + col * SQUARE_SIZE + SQUARE_SIZE // 2
+                center_y = self.board_offset_y + row * SQUARE_SIZE + SQUARE_SIZE // 2
+
+                # Different indicator for capture vs empty square
+                if piece:
+                    pygame.draw.circle(self.screen, (255, 100, 100), (center_x, center_y), 15)
+                else:
+                    pygame.draw.circle(self.screen, (100, 255, 100), (center_x, center_y), 12)
+
+        # Draw pieces
+        for sq, (code, in_check, selected, valid_move) in enumerate(state['squares']):
+            if code:
+                row, col = sq // 8, sq % 8
+                piece = game.board[row][col]
+                x = self.board_offset_x + col * SQUARE_SIZE + (SQUARE_SIZE - PIECE_WIDTH) // 2
+                y = self.board_offset_y + row * SQUARE_SIZE + (SQUARE_SIZE - PIECE_HEIGHT) // 2
+                self.screen.blit(self.sprites.get('board', piece.color, piece.type), (x, y))
+
+        # NEW: Draw captured pieces
+        self.draw_captured_pieces(game)
+
+        # NEW: Draw undo button
+        self.draw_undo_button(game)
+
+        # Draw promotion dialog
+        if game.promoting_pawn:
+            self.draw_promotion_dialog(game)
+
+        # Draw turn indicator or game over message
+        font = self.font(48)
+        if game.game_over:
+            if game.color == game.winner:
+                text = font.render(f"GAME OVER! Player Wins!", True, (255, 50, 50))
+            elif game.winner in ['black', 'white']:
+                text = font.render(f"GAME OVER! Clifford Wins!", True, (255, 50, 50))
+            else:
+                text = font.render(f"GAME OVER! Nobody Wins! (Stalemate)", True, (255, 50, 50))
+            text_rect = text.get_rect(center=(self.screen_width // 2, self.board_offset_y - 60))
+
+            bg_rect = text_rect.inflate(40, 20)
+            pygame.draw.rect(self.screen, (0, 0, 0), bg_rect)
+            pygame.draw.rect(self.screen, (255, 50, 50), bg_rect, 3)
+
+            self.screen.blit(text, text_rect)
+        else:
+            if game.current_turn == 'white':
+                turn_text = "Player's Turn"
+            else:
+                turn_text = "Clifford's Turn"
+            if state['banner'][-1]:
+                turn_text += " - CHECK!"
+            text = font.render(turn_text, True, (255, 255, 255))
+            text_rect = text.get_rect(center=(self.screen_width // 2, self.board_offset_y - 50))
+            self.screen.blit(text, text_rect)
+
+        if self.shown is None:
+            pygame.display.flip()
+        else:
+            pygame.display.update(self.get_dirty_rects(state))
+        self.shown = state
+
+    # NEW: Draw captured pieces
+    def draw_captured_pieces(self, game):
+        """Draw the captured pieces on the sides of the board"""
+        piece_size = CAPTURED_SIZE
+        padding = 5
+        start_x_left = self.board_offset_x - 250
+        start_x_right = self.board_offset_x + SQUARE_SIZE * 8 - 820
+        start_y = self.board_offset_y
+
+        font = self.font(28)
+        if game.color == 'white':
+            label = font.render("Player value:  " + str(game.get_value('white') - game.get_value('black')), True, (255, 255, 255))
+        else:
+            label = font.render("Player value:  " + str(game.get_value('black') - game.get_value('white')), True, (255, 255, 255))
+        self.screen.blit(label, (start_x_left - 20, start_y - 80))
+
+        # Draw white's captures (left side)
+        label = font.render("White captured:", True, (255, 255, 255))
+        self.screen.blit(label, (start_x_left - 120, start_y - 30))
+
+        for i, piece_type in enumerate(self.expand_captured(game.white_captured)):
+            y_pos = start_y + (i * (piece_size + padding))
+            self.screen.blit(self.sprites.get('captured', 'black', piece_type), (start_x_left, y_pos))
+
+        # Draw black's captures (right side)
+        label = font.render("Black captured:", True, (255, 255, 255))
+        self.screen.blit(label, (start_x_right, start_y - 30))
+
+        for i, piece_type in enumerate(self.expand_captured(game.black_captured)):
+            y_pos = start_y + (i * (piece_size + padding))
+            self.screen.blit(self.sprites.get('captured', 'white', piece_type), (start_x_right, y_pos))
+
+    def expand_captured(self, counts):
+        """One piece type per captured piece, from counts by piece type"""
+        return [piece_type for piece_type, count in counts.items() for i in range(count)]
+
+    # NEW: Draw undo button
+    def draw_undo_button(self, game):
+        """Draw the undo button"""
+        if not game.can_undo():
+            self.undo_button_rect = None
+            return
+
+        self.undo_button_rect = self.get_undo_button_rect()
+
+        # Draw button background
+        pygame.draw.rect(self.screen, (70, 70, 70), self.undo_button_rect)
+        pygame.draw.rect(self.screen, (200, 200, 200), self.undo_button_rect, 2)
+
+        # Draw button text
+        font = self.font(32)
+        text = font.render("Undo", True, (255, 255, 255))
+        text_rect = text.get_rect(center=self.undo_button_rect.center)
+        self.screen.blit(text, text_rect)
+
+    def draw_promotion_dialog(self, game):
+        """Draw the promotion selection dialog"""
+        choices = PROMOTION_CHOICES
+        choice_width = CHOICE_WIDTH
+        choice_height = CHOICE_HEIGHT
+
+        # Draw background
+        dialog_rect = self.get_dialog_rect()
+        dialog_y = dialog_rect.y
+
+        pygame.draw.rect(self.screen, (50, 50, 50), dialog_rect)
+        pygame.draw.rect(self.screen, (255, 255, 255), dialog_rect, 3)
+
+        # Draw title
+        font = self.font(32)
+        text = font.render("Choose Promotion:", True, (255, 255, 255))
+        text_rect = text.get_rect(center=(self.screen_width // 2, dialog_y + 20))
+        self.screen.blit(text, text_rect)
+
+        # Draw piece choices
+        start_x = self.screen_width // 2 - (len(choices) * choice_width) // 2
+        start_y = dialog_y + 50
+
+        for i, piece_type in enumerate(choices):
+            x = start_x + i * choice_width
+            rect = pygame.Rect(x, start_y, choice_width, choice_height)
+            pygame.draw.rect(self.screen, (100, 100, 100), rect)
+            pygame.draw.rect(self.screen, (200, 200, 200), rect, 2)
+
+            # Draw piece image
+            img = self.sprites.get('promotion', game.promoting_pawn.color, piece_type)
+            self.screen.blit(img, (x + 10, start_y + 5))
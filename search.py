@@ -0,0 +1,545 @@
+#!/usr/bin/env python3
+
+# Negamax alpha-beta search over ChessGame's own legal move generation.
+# Iterative deepening searches depth 1, 2, ... until the time limit runs out,
+# keeping the best move of the last finished depth. Results are stored in a
+# transposition table so each depth starts from the previous one's best moves.
+# Leaves are resolved by a captures-only quiescence search, skipping captures
+# that static exchange evaluation (see) says lose material. Moves are handed
+# out a stage at a time by pick_moves, so a node cut off by its first moves
+# never generates the rest.
+
+import time
+from array import array
+from itertools import islice
+
+import bitboard
+import core
+import transposition
+from bitboard import COLORS, PIECE_TYPES, WHITE, PAWN, KING
+
+MATE = 100000
+# Mate scores are stored relative to the node, not the root
+MATE_BOUND = MATE - 1000
+INFINITY = MATE + 1
+
+PIECE_VALUES = {'pawn': 100, 'knight': 320, 'bishop': 330, 'rook': 500, 'queen': 900, 'king': 0}
+# PIECE_VALUES by piece type code
+KIND_VALUES = tuple(PIECE_VALUES[piece_type] for piece_type in PIECE_TYPES)
+# PIECE_VALUES by core.Piece.code, 0 for an empty square
+CODE_VALUES = (0,) + KIND_VALUES * len(COLORS)
+
+# Piece-square tables from white's point of view, row 0 being black's back rank
+PAWN_TABLE = (
+      0,   0,   0,   0,   0,   0,   0,   0,
+     50,  50,  50,  50,  50,  50,  50,  50,
+     10,  10,  20,  30,  30,  20,  10,  10,
+      5,   5,  10,  25,  25,  10,   5,   5,
+      0,   0,   0,  20,  20,   0,   0,   0,
+      5,  -5, -10,   0,   0, -10,  -5,   5,
+      5,  10,  10, -20, -20,  10,  10,   5,
+      0,   0,   0,   0,   0,   0,   0,   0,
+)
+KNIGHT_TABLE = (
+    -50, -40, -30, -30, -30, -30, -40, -50,
+    -40, -20,   0,   0,   0,   0, -20, -40,
+    -30,   0,  10,  15,  15,  10,   0, -30,
+    -30,   5,  15,  20,  20,  15,   5, -30,
+    -30,   0,  15,  20,  20,  15,   0, -30,
+    -30,   5,  10,  15,  15,  10,   5, -30,
+    -40, -20,   0,   5,   5,   0, -20, -40,
+    -50, -40, -30, -30, -30, -30, -40, -50,
+)
+BISHOP_TABLE = (
+    -20, -10, -10, -10, -10, -10, -10, -20,
+    -10,   0,   0,   0,   0,   0,   0, -10,
+    -10,   0,   5,  10,  10,   5,   0, -10,
+    -10,   5,   5,  10,  10,   5,   5, -10,
+    -10,   0,  10,  10,  10,  10,   0, -10,
+    -10,  10,  10,  10,  10,  10,  10, -10,
+    -10,   5,   0,   0,   0,   0,   5, -10,
+    -20, -10, -10, -10, -10, -10, -10, -20,
+)
+ROOK_TABLE = (
+      0,   0,   0,   0,   0,   0,   0,   0,
+      5,  10,  10,  10,  10,  10,  10,   5,
+     -5,   0,   0,   0,   0,   0,   0,  -5,
+     -5,   0,   0,   0,   0,   0,   0,  -5,
+     -5,   0,   0,   0,   0,   0,   0,  -5,
+     -5,   0,   0,   0,   0,   0,   0,  -5,
+     -5,   0,   0,   0,   0,   0,   0,  -5,
+      0,   0,   0,   5,   5,   0,   0,   0,
+)
+QUEEN_TABLE = (
+    -20, -10, -10,  -5,  -5, -10, -10, -20,
+    -10,   0,   0,   0,   0,   0,   0, -10,
+    -10,   0,   5,   5,   5,   5,   0, -10,
+     -5,   0,   5,   5,   5,   5,   0,  -5,
+      0,   0,   5,   5,   5,   5,   0,  -5,
+    -10,   5,   5,   5,   5,   5,   0, -10,
+    -10,   0,   5,   0,   0,   0,   0, -10,
+    -20, -10, -10,  -5,  -5, -10, -10, -20,
+)
+KING_TABLE = (
+    -30, -40, -40, -50, -50, -40, -40, -30,
+    -30, -40, -40, -50, -50, -40, -40, -30,
+    -30, -40, -40, -50, -50, -40, -40, -30,
+    -30, -40, -40, -50, -50, -40, -40, -30,
+    -20, -30, -30, -40, -40, -30, -30, -20,
+    -10, -20, -20, -20, -20, -20, -20, -10,
+     20,  20,   0,   0,   0,   0,  20,  20,
+     20,  30,  10,   0,   0,  10,  30,  20,
+)
+# KIND_VALUES for see: exchanges may end with the king recapturing, but never with it being taken
+SEE_VALUES = KIND_VALUES[:KING] + (20000,)
+
+# Piece-square tables by piece type code
+PIECE_TABLES = (PAWN_TABLE, KNIGHT_TABLE, BISHOP_TABLE, ROOK_TABLE, QUEEN_TABLE, KING_TABLE)
+
+# Default search limits of Engine
+TIME_LIMIT = 2.0
+MAX_DEPTH = 64
+# Size of the table used when the game does not share one
+TABLE_MEGABYTES = 16
+# Evaluations kept by a Session before its cache is emptied
+EVALUATION_CACHE_SIZE = 1 << 18
+# Quiet moves by from << 6 | to, the index of the history and countermove tables
+MOVE_SLOTS = 4096
+
+
+def evaluate(game, color):
+    """Material and piece placement, in centipawns from color's point of view"""
+    score = 0
+    for sq, code in enumerate(game.codes):
+        if not code:
+            continue
+        side, kind = divmod(code - 1, 6)
+        if side == WHITE:
+            score += KIND_VALUES[kind] + PIECE_TABLES[kind][sq]
+        else:
+            # Black's tables are white's turned upside down
+            score -= KIND_VALUES[kind] + PIECE_TABLES[kind][sq ^ 56]
+    return score if color == 'white' else -score
+
+
+def is_capture(game, piece, move):
+    return game.board[move[0]][move[1]] is not None or \
+        (piece.kind == PAWN and move == game.en_passant_target)
+
+
+def see(game, piece, move):
+    """Static exchange evaluation: material won by piece moving to move once
+    both sides have traded off every capture on that square, in centipawns"""
+    bitboards = game.bitboards
+    (from_row, from_col), (to_row, to_col) = piece.position, move
+    to_sq = to_row * 8 + to_col
+    occupied = bitboards.all ^ (1 << (from_row * 8 + from_col))
+    victim = game.board[to_row][to_col]
+    if victim is not None:
+        gains = [SEE_VALUES[victim.kind]]
+    elif piece.kind == PAWN and move == game.en_passant_target:
+        gains = [SEE_VALUES[PAWN]]
+        occupied ^= 1 << (from_row * 8 + to_col)
+    else:
+        gains = [0]
+
+    # Each side recaptures with its least valuable attacker, sliders behind it joining in
+    on_square = SEE_VALUES[piece.kind]
+    side = piece.side ^ 1
+    while True:
+        attackers = game.attackers_to(to_sq, side, occupied) & occupied
+        if not attackers:
+            break
+        pieces = bitboards.pieces[side]
+        for kind in range(KING + 1):
+            attacker = attackers & pieces[kind]
+            if attacker:
+                break
+        gains.append(on_square - gains[-1])
+        on_square = SEE_VALUES[kind]
+        occupied ^= attacker & -attacker
+        side ^= 1
+
+    # Either side may stop capturing when carrying on loses material
+    while len(gains) > 1:
+        gain = gains.pop()
+        gains[-1] = -max(-gains[-1], gain)
+    return gains[0]
+
+
+def see_move(game, move):
+    """see for a move packed by core.pack_move"""
+    from_sq = move >> 6 & 63
+    return see(game, game.board[from_sq >> 3][from_sq & 7], bitboard.COORDS[move & 63])
+
+
+def to_table_score(score, ply):
+    if score > MATE_BOUND:
+        return score + ply
+    if score < -MATE_BOUND:
+        return score - ply
+    return score
+
+
+def from_table_score(score, ply):
+    if score > MATE_BOUND:
+        return score - ply
+    if score < -MATE_BOUND:
+        return score + ply
+    return score
+
+
+class SearchTimeout(Exception):
+    pass
+
+
+class Session:
+
+    """What the engine keeps for a whole game: the transposition table, an
+    evaluation cache, the hashes of the positions played so far and the
+    move ordering tables"""
+
+    def __init__(self, color, table=None, time_limit=TIME_LIMIT, max_depth=MAX_DEPTH):
+        self.color = color
+        if table is None:
+            table = transposition.TranspositionTable(TABLE_MEGABYTES)
+        self.table = table
+        self.time_limit = time_limit
+        self.max_depth = max_depth
+        # White's evaluation by position hash
+        self.evaluations = {}
+        # Positions of the game, oldest first: reaching one again in a search is a draw
+        self.played = []
+        # Two quiet moves by ply that last cut a search off, at ply * 2 and ply * 2 + 1
+        self.killers = array('H', bytes(4 * core.MAX_PLY))
+        # How much each quiet move cut searches off, by side * MOVE_SLOTS + move
+        self.history = array('q', bytes(8 * 2 * MOVE_SLOTS))
+        # Quiet move that last cut a search off in reply to a move
+        self.countermoves = array('H', bytes(2 * MOVE_SLOTS))
+
+    def engine(self, game, color=None, ponder=False):
+        """A search of game's position, for self.color unless told otherwise"""
+        return Engine(game, color or self.color, time_limit=self.time_limit,
+                      max_depth=self.max_depth, ponder=ponder, session=self)
+
+    def push(self, key):
+        """A move was played in the game, reaching the position hashed key"""
+        self.played.append(key)
+
+    def undo(self, plies):
+        """Moves were taken back in the game"""
+        del self.played[len(self.played) - plies:]
+
+    def age(self):
+        """A new search starts: killers of the last position no longer apply,
+        history from earlier searches counts half as much and table entries
+        of earlier searches may be replaced"""
+        self.table.new_search()
+        self.killers[:] = array('H', bytes(4 * core.MAX_PLY))
+        self.history[:] = array('q', [score >> 1 for score in self.history])
+
+
+class Engine:
+
+    """Alpha-beta player with the same play(game) entry point as bot.AI"""
+
+    def __init__(self, game, color, table=None, time_limit=TIME_LIMIT, max_depth=MAX_DEPTH, ponder=False,
+                 session=None):
+
+        self.color = color
+        self.enemy_color = 'black' if color == 'white' else 'white'
+        if session is None:
+            session = Session(color, table, time_limit, max_depth)
+        self.session = session
+        self.table = session.table
+        self.evaluations = session.evaluations
+        # Positions already on the board or on the line being searched
+        self.repetitions = set(session.played)
+        self.time_limit = time_limit
+        self.max_depth = max_depth
+        self.best_piece = None
+        self.best_move = None
+        self.score = 0
+        self.depth = 0
+        self.nodes = 0
+        self.deadline = None
+        self.stopped = False
+        # A pondering search has no deadline until ponderhit
+        self.pondering = ponder
+        # Move lists by ply, filled again at every node instead of allocated
+        self.buffers = [array('H', bytes(2 * core.MAX_MOVES)) for ply in range(core.MAX_PLY)]
+        # Move being searched at each ply, for the countermoves of the next one
+        self.line = array('H', bytes(2 * core.MAX_PLY))
+        self.killers = session.killers
+        self.history = session.history
+        self.countermoves = session.countermoves
+        self.debug = 'No debug.'
+
+    def stop(self):
+        """Make a running search return its best move so far, from any thread"""
+        self.stopped = True
+
+    def ponderhit(self):
+        """The move pondered on was played: the search now runs against its time limit"""
+        self.deadline = time.time() + self.time_limit
+        self.pondering = False
+
+    def evaluate(self, game, side):
+        """evaluate, cached, from the point of view of a side given by color code"""
+        score = self.evaluations.get(game.hash)
+        if score is None:
+            if len(self.evaluations) >= EVALUATION_CACHE_SIZE:
+                self.evaluations.clear()
+            score = self.evaluations[game.hash] = evaluate(game, 'white')
+        return score if side == WHITE else -score
+
+    def order_moves(self, game, moves, hash_move):
+        """Hash move first, then captures by most valuable victim / least valuable attacker"""
+        codes = game.codes
+        def key(move):
+            if move & 0xfff == hash_move:
+                return -INFINITY
+            victim = codes[move & 63]
+            if victim:
+                return -10 * CODE_VALUES[victim] + CODE_VALUES[codes[move >> 6 & 63]] // 100
+            if move >> 12 == core.EN_PASSANT:
+                return -10 * PIECE_VALUES['pawn'] + 1
+            return 0
+        return sorted(moves, key=key)
+
+    def pick_moves(self, game, context, hash_move, ply, quiets=True):
+        """Legal moves of the side to move, generated only as each stage is
+        reached: the hash move, captures not losing material by most valuable
+        victim / least valuable attacker, killers, the countermove of the last
+        move, quiet moves by history and captures losing material. Without
+        quiets, only the good captures."""
+        if hash_move:
+            hash_move = game.legal_move(hash_move, context)
+            if hash_move:
+                yield hash_move
+                hash_move &= 0xfff
+
+        codes = game.codes
+        buffer = self.buffers[ply]
+        count = game.generate_moves(buffer, context, core.CAPTURES)
+        # Scores go above the move so plain integers sort in the wanted order
+        scored = []
+        for move in islice(buffer, count):
+            if move & 0xfff == hash_move:
+                continue
+            victim = CODE_VALUES[codes[move & 63]] or (PIECE_VALUES['pawn'] if move >> 12 == core.EN_PASSANT else 0)
+            if move >> 12 == core.PROMOTE_QUEEN:
+                victim += PIECE_VALUES['queen']
+            scored.append((victim * 10 - CODE_VALUES[codes[move >> 6 & 63]] // 100 + 100) << 16 | move)
+        scored.sort(reverse=True)
+        bad = []
+        for move in scored:
+            move &= 0xffff
+            # Only a capture by a piece worth more than its victim can lose material
+            if CODE_VALUES[codes[move >> 6 & 63]] > CODE_VALUES[codes[move & 63]] and \
+                    move >> 12 != core.PROMOTE_QUEEN and see_move(game, move) < 0:
+                bad.append(move)
+                continue
+            yield move
+        if not quiets:
+            return
+
+        killers = self.killers
+        counter = self.countermoves[self.line[ply - 1] & 0xfff] if ply else 0
+        skipped = (hash_move, killers[ply * 2], killers[ply * 2 + 1], counter)
+        tried = [hash_move]
+        for killer in skipped[1:]:
+            if killer and killer not in tried and not codes[killer & 63]:
+                tried.append(killer)
+                move = game.legal_move(killer, context)
+                if move and move >> 12 != core.EN_PASSANT and move >> 12 != core.PROMOTE_QUEEN:
+                    yield move
+
+        history = self.history
+        side = game.side_to_move * MOVE_SLOTS
+        count = game.generate_moves(buffer, context, core.QUIETS)
+        scored = [history[side + (move & 0xfff)] << 16 | move for move in islice(buffer, count)
+                  if move & 0xfff not in skipped]
+        scored.sort(reverse=True)
+        for move in scored:
+            yield move & 0xffff
+        yield from bad
+
+    def search(self, game):
+        """Iterative deepening from the current position; returns (piece, move, score)"""
+        self.deadline = float('inf') if self.pondering else time.time() + self.time_limit
+        self.nodes = 0
+        self.session.age()
+        # The root keeps its own list, reordered from one depth to the next
+        buffer = self.buffers[0]
+        moves = buffer[:game.generate_moves(buffer)].tolist()
+        if not moves:
+            return None, None, 0
+        self.repetitions.add(game.hash)
+        # Fall back on the first legal move if depth 1 runs out of time
+        best_move, score = moves[0], 0
+        # Every move is taken back before the search returns, so the attack
+        # map, which the search never reads, is right again by then
+        keep_attack_map = game.keep_attack_map
+        game.keep_attack_map = False
+        try:
+            for depth in range(1, self.max_depth + 1):
+                try:
+                    best_move, score = self.search_root(game, moves, depth)
+                except SearchTimeout:
+                    break
+                self.depth = depth
+                # Nothing left to learn once a forced mate was found
+                if abs(score) > MATE_BOUND or len(moves) == 1 or self.stopped:
+                    break
+        finally:
+            game.keep_attack_map = keep_attack_map
+        from_sq = best_move >> 6 & 63
+        return game.board[from_sq >> 3][from_sq & 7], bitboard.COORDS[best_move & 63], score
+
+    def search_root(self, game, moves, depth):
+        entry = self.table.probe(game.hash)
+        hash_move = entry[3] if entry else 0
+        moves[:] = self.order_moves(game, moves, hash_move)
+
+        alpha, beta = -INFINITY, INFINITY
+        best_move = moves[0]
+        for move in moves:
+            self.line[0] = move
+            game.push_move(move)
+            try:
+                score = -self.negamax(game, depth - 1, -beta, -alpha, 1)
+            finally:
+                game.pop()
+            if score > alpha:
+                alpha = score
+                best_move = move
+
+        self.table.store(game.hash, depth, to_table_score(alpha, 0), transposition.EXACT, best_move & 0xfff)
+        # Search the best move first at the next depth
+        moves.remove(best_move)
+        moves.insert(0, best_move)
+        return best_move, alpha
+
+    def negamax(self, game, depth, alpha, beta, ply):
+        self.nodes += 1
+        if self.nodes & 1023 == 0 and (self.stopped or time.time() > self.deadline):
+            raise SearchTimeout()
+
+        key = game.hash
+        if key in self.repetitions:
+            return 0
+
+        original_alpha = alpha
+        entry = self.table.probe(key)
+        hash_move = 0
+        if entry:
+            entry_depth, score, bound, hash_move = entry
+            if entry_depth >= depth:
+                score = from_table_score(score, ply)
+                if bound == transposition.EXACT:
+                    return score
+                if bound == transposition.LOWER and score >= beta:
+                    return score
+                if bound == transposition.UPPER and score <= alpha:
+                    return score
+
+        if depth <= 0:
+            return self.quiesce(game, alpha, beta, ply)
+        context = game.get_legal_context(game.side_to_move)
+
+        best_score = -INFINITY
+        best_move = 0
+        self.repetitions.add(key)
+        try:
+            for move in self.pick_moves(game, context, hash_move, ply):
+                quiet = not game.codes[move & 63] and move >> 12 in (0, core.CASTLE, core.DOUBLE_PUSH)
+                self.line[ply] = move
+                game.push_move(move)
+                try:
+                    score = -self.negamax(game, depth - 1, -beta, -alpha, ply + 1)
+                finally:
+                    game.pop()
+                if score > best_score:
+                    best_score = score
+                    best_move = move & 0xfff
+                if score > alpha:
+                    alpha = score
+                if alpha >= beta:
+                    if quiet:
+                        self.store_cutoff(game, best_move, depth, ply)
+                    break
+        finally:
+            self.repetitions.discard(key)
+        if not best_move:
+            # No legal move: mate or stalemate
+            return -MATE + ply if context is not None and context[1] else 0
+
+        if best_score <= original_alpha:
+            bound = transposition.UPPER
+        elif best_score >= beta:
+            bound = transposition.LOWER
+        else:
+            bound = transposition.EXACT
+        self.table.store(key, depth, to_table_score(best_score, ply), bound, best_move)
+        return best_score
+
+    def quiesce(self, game, alpha, beta, ply):
+        """Search captures only until the position is quiet, so the
+        evaluation never stops halfway through an exchange"""
+        self.nodes += 1
+        if self.nodes & 1023 == 0 and (self.stopped or time.time() > self.deadline):
+            raise SearchTimeout()
+
+        side = game.side_to_move
+        context = game.get_legal_context(side)
+        in_check = context is not None and context[1] != 0
+        if in_check:
+            # Every evasion has to be looked at, there is no standing still in check
+            best_score = -INFINITY
+        else:
+            best_score = self.evaluate(game, side)
+            if best_score >= beta:
+                return best_score
+            alpha = max(alpha, best_score)
+
+        # Captures that lose material on their square are not worth a look
+        for move in self.pick_moves(game, context, 0, ply, quiets=in_check):
+            self.line[ply] = move
+            game.push_move(move)
+            try:
+                score = -self.quiesce(game, -beta, -alpha, ply + 1)
+            finally:
+                game.pop()
+            if score > best_score:
+                best_score = score
+            if score > alpha:
+                alpha = score
+            if alpha >= beta:
+                break
+        if best_score == -INFINITY:
+            return -MATE + ply
+        return best_score
+
+    def store_cutoff(self, game, move, depth, ply):
+        """A quiet move cut the search off: try it early in the positions around"""
+        killers = self.killers
+        if killers[ply * 2] != move:
+            killers[ply * 2 + 1] = killers[ply * 2]
+            killers[ply * 2] = move
+        self.history[game.side_to_move * MOVE_SLOTS + move] += depth * depth
+        if ply:
+            self.countermoves[self.line[ply - 1] & 0xfff] = move
+
+    def play(self, game):
+
+        self.best_piece, self.best_move, self.score = self.search(game)
+        if not self.best_move or not self.best_piece:
+            print("Error.")
+            game.game_over = True
+            game.winner = 'Player'
+            return
+        game.make_move(self.best_piece, self.best_move)
+        self.debug = f'Depth {self.depth}, score {self.score}, {self.nodes} nodes.'
+        print(self.debug)
+        return
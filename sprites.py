@@ -0,0 +1,34 @@
+#!/usr/bin/env python3
+
+# Piece sprites sliced once from the sprite sheets in assets/pieces. Each
+# sheet is a row of 16x32 frames, one per piece type in SHEET_ORDER. Every
+# frame is scaled up front to each size the renderer draws pieces at, so
+# drawing a frame never loads or scales an image.
+
+import os
+
+import pygame
+
+PIECES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'assets', 'pieces')
+SHEETS = {'white': 'WhitePieces-Sheet.png', 'black': 'BlackPieces-Sheet.png'}
+SHEET_ORDER = ('pawn', 'knight', 'rook', 'bishop', 'queen', 'king')
+FRAME_WIDTH = 16
+FRAME_HEIGHT = 32
+
+
+class SpriteAtlas:
+
+    """Scaled piece surfaces by size name, color and piece type"""
+
+    def __init__(self, sizes):
+        # sizes maps a size name to the (width, height) to scale frames to
+        self.sprites = {name: {} for name in sizes}
+        for color, filename in SHEETS.items():
+            sheet = pygame.image.load(os.path.join(PIECES_DIR, filename)).convert_alpha()
+            for i, piece_type in enumerate(SHEET_ORDER):
+                frame = sheet.subsurface((i * FRAME_WIDTH, 0, FRAME_WIDTH, FRAME_HEIGHT))
+                for name, size in sizes.items():
+                    self.sprites[name][color, piece_type] = pygame.transform.scale(frame, size)
+
+    def get(self, name, color, piece_type):
+        return self.sprites[name][color, piece_type]
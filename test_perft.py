@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+
+# Move generation counted against known perft results: the number of leaf
+# positions a given number of plies below a position. Run with
+# python -m unittest or pytest.
+
+import unittest
+from array import array
+
+import core
+from bitboard import WHITE, BLACK
+from core import Piece
+
+FEN_TYPES = {'p': 'pawn', 'n': 'knight', 'b': 'bishop', 'r': 'rook', 'q': 'queen', 'k': 'king'}
+
+START = 'rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq -'
+KIWIPETE = 'r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq -'
+POSITION_3 = '8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - -'
+
+
+class FenGame(core.ChessGame):
+
+    """core.ChessGame set up from the placement, turn, castling and en passant fields of a FEN"""
+
+    def __init__(self, fen):
+        self.fen = fen
+        super().__init__()
+
+    def setup_board(self):
+        placement, turn, castling, en_passant = self.fen.split()[:4]
+        for row, rank in enumerate(placement.split('/')):
+            col = 0
+            for char in rank:
+                if char.isdigit():
+                    col += int(char)
+                    continue
+                color = 'white' if char.isupper() else 'black'
+                piece = Piece(color, FEN_TYPES[char.lower()], (row, col))
+                # Only pawns on their starting row may still push two squares,
+                # and only kings and rooks named by the castling field may castle
+                if piece.type == 'pawn':
+                    piece.has_moved = row != (6 if color == 'white' else 1)
+                elif piece.type in ('king', 'rook'):
+                    piece.has_moved = True
+                self.board[row][col] = piece
+                col += 1
+        for right, row, col in (('K', 7, 7), ('Q', 7, 0), ('k', 0, 7), ('q', 0, 0)):
+            if right in castling:
+                self.board[row][4].has_moved = False
+                self.board[row][col].has_moved = False
+        self.side_to_move = WHITE if turn == 'w' else BLACK
+        if en_passant != '-':
+            self._en_passant_target = (8 - int(en_passant[1]), ord(en_passant[0]) - ord('a'))
+
+
+def perft(game, depth, buffers):
+    """Leaf positions depth plies below game's position; promotions are only
+    generated to a queen, so positions must not reach one within depth"""
+    buffer = buffers[depth]
+    count = game.generate_moves(buffer)
+    if depth == 1:
+        return count
+    nodes = 0
+    for move in buffer[:count]:
+        game.push_move(move)
+        nodes += perft(game, depth - 1, buffers)
+        game.pop()
+    return nodes
+
+
+class PerftTest(unittest.TestCase):
+
+    def check(self, fen, depth, expected):
+        game = FenGame(fen)
+        key = game.hash
+        buffers = [array('H', bytes(2 * core.MAX_MOVES)) for ply in range(depth + 1)]
+        self.assertEqual(perft(game, depth, buffers), expected)
+        self.assertEqual(game.hash, key)
+
+    def test_start(self):
+        self.check(START, 4, 197281)
+
+    def test_kiwipete(self):
+        self.check(KIWIPETE, 3, 97862)
+
+    def test_position_3(self):
+        self.check(POSITION_3, 4, 43238)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+
+# ChessGame.push and pop must leave the position exactly as they found it.
+# Run with python -m unittest or pytest.
+
+import unittest
+from array import array
+
+import core
+from test_perft import KIWIPETE, FenGame
+
+# White may take f6 en passant
+EN_PASSANT = 'rnbqkbnr/ppp1p1pp/8/3pPp2/8/8/PPPP1PPP/RNBQKBNR w KQkq f6'
+# Both sides promote, by pushing or capturing, and white may castle
+PROMOTION = 'n1n1k3/1P6/8/8/8/8/1p6/R3K2R w KQ -'
+
+
+def snapshot(game):
+    board = [(piece, piece.side, piece.kind, piece.position, piece.has_moved) if piece else None
+             for row in game.board for piece in row]
+    bitboards = game.bitboards
+    return (board, [list(pieces) for pieces in bitboards.pieces], list(bitboards.occupied), bitboards.all,
+            bytes(game.codes), game.castling_rights, game.hash, game.current_turn, game.en_passant_target)
+
+
+class PushTest(unittest.TestCase):
+
+    def setUp(self):
+        core.ChessGame.debug_hash = True
+
+    def tearDown(self):
+        core.ChessGame.debug_hash = False
+
+    def walk(self, game, depth, flags):
+        """push and pop every legal move depth plies deep, counting move flags"""
+        buffer = array('H', bytes(2 * core.MAX_MOVES))
+        count = game.generate_moves(buffer)
+        before = snapshot(game)
+        for move in buffer[:count]:
+            flags.add(move >> 12)
+            game.push_move(move)
+            if depth > 1:
+                self.walk(game, depth - 1, flags)
+            game.pop()
+            self.assertEqual(snapshot(game), before)
+
+    def check(self, fen, depth, wanted):
+        game = FenGame(fen)
+        flags = set()
+        self.walk(game, depth, flags)
+        self.assertEqual(game.ply, 0)
+        self.assertLessEqual(set(wanted), flags)
+
+    def test_castling(self):
+        self.check(KIWIPETE, 2, (core.CASTLE, core.DOUBLE_PUSH))
+
+    def test_en_passant(self):
+        self.check(EN_PASSANT, 2, (core.EN_PASSANT, core.DOUBLE_PUSH))
+
+    def test_promotion(self):
+        self.check(PROMOTION, 2, (core.PROMOTE_QUEEN, core.CASTLE))
+
+
+if __name__ == '__main__':
+    unittest.main()
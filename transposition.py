@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+
+# Fixed-size transposition table keyed by ChessGame.hash. Entries live in
+# parallel arrays rather than one object per entry, so the memory budget is
+# allocated once and never grows.
+#
+# With the 'depth' policy every bucket has two slots: the first keeps the
+# deepest result seen for its index, the second is always replaced. With the
+# 'always' policy buckets have a single slot that the newest store overwrites.
+# Entries remember the search generation that stored them, so a table kept
+# across searches lets results of earlier searches go however deep they were.
+
+from array import array
+
+EMPTY = 0
+EXACT = 1
+LOWER = 2
+UPPER = 3
+
+# key (Q) + score (i) + move (H) + depth (b) + bound (B) + generation (B)
+ENTRY_SIZE = 8 + 4 + 2 + 1 + 1 + 1
+
+
+def encode_move(old_pos, new_pos):
+    """Pack a move into 12 bits (0 means no move)"""
+    return (old_pos[0] * 8 + old_pos[1]) << 6 | new_pos[0] * 8 + new_pos[1]
+
+
+def decode_move(move):
+    from_sq, to_sq = move >> 6, move & 63
+    return (from_sq >> 3, from_sq & 7), (to_sq >> 3, to_sq & 7)
+
+
+class TranspositionTable:
+
+    def __init__(self, megabytes=16, policy='depth'):
+        if policy not in ('depth', 'always'):
+            raise ValueError(f"Unknown replacement policy: {policy}")
+        self.policy = policy
+        self.bucket_size = 2 if policy == 'depth' else 1
+
+        # As many buckets as fit the budget; a key picks its bucket by remainder
+        self.buckets = max(1, int(megabytes * 1024 * 1024) // (ENTRY_SIZE * self.bucket_size))
+        size = self.buckets * self.bucket_size
+
+        self.keys = array('Q', bytes(8 * size))
+        self.scores = array('i', bytes(4 * size))
+        self.moves = array('H', bytes(2 * size))
+        self.depths = array('b', bytes(size))
+        self.bounds = array('B', bytes(size))
+        self.generations = array('B', bytes(size))
+        # Counts searches, wrapping around at 256, see new_search
+        self.generation = 0
+        self.reset_stats()
+
+    def __len__(self):
+        return len(self.keys)
+
+    def reset_stats(self):
+        self.hits = 0
+        self.misses = 0
+        self.collisions = 0
+        self.stores = 0
+
+    def clear(self):
+        size = len(self.keys)
+        self.keys = array('Q', bytes(8 * size))
+        self.bounds = array('B', bytes(size))
+        self.reset_stats()
+
+    def new_search(self):
+        """Start a new generation: entries stored so far no longer hold on to the depth-preferred slot"""
+        self.generation = (self.generation + 1) & 0xff
+
+    def probe(self, key):
+        """Return (depth, score, bound, move) stored for key, or None"""
+        index = key % self.buckets * self.bucket_size
+        for slot in range(index, index + self.bucket_size):
+            if self.keys[slot] == key and self.bounds[slot] != EMPTY:
+                self.hits += 1
+                return self.depths[slot], self.scores[slot], self.bounds[slot], self.moves[slot]
+        self.misses += 1
+        return None
+
+    def store(self, key, depth, score, bound, move=0):
+        index = key % self.buckets * self.bucket_size
+        slot = index
+        if self.bucket_size == 2:
+            # The depth-preferred slot only gives way to deeper (or same-position)
+            # results, unless an earlier search stored it
+            if self.bounds[index] != EMPTY and self.keys[index] != key and depth < self.depths[index] and \
+                    self.generations[index] == self.generation:
+                slot = index + 1
+        if self.bounds[slot] != EMPTY:
+            if self.keys[slot] != key:
+                # Evicting another position
+                self.collisions += 1
+            elif not move:
+                # Keep the best move of an earlier search of the same position
+                move = self.moves[slot]
+        self.keys[slot] = key
+        self.scores[slot] = score
+        self.moves[slot] = move
+        self.depths[slot] = depth
+        self.bounds[slot] = bound
+        self.generations[slot] = self.generation
+        self.stores += 1
+
+    def usage(self):
+        """Fraction of the slots in use"""
+        return sum(1 for bound in self.bounds if bound != EMPTY) / len(self.bounds)
+
+    def stats(self):
+        probes = self.hits + self.misses
+        return {
+            'entries': len(self.keys),
+            'megabytes': len(self.keys) * ENTRY_SIZE / (1024 * 1024),
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / probes if probes else 0.0,
+            'collisions': self.collisions,
+            'stores': self.stores,
+            'usage': self.usage(),
+        }
@@ -0,0 +1,46 @@
+#!/usr/bin/env python3
+
+# Zobrist keys: a position's hash is the XOR of one random 64-bit key per
+# (color, piece type, square) on the board, plus keys for the side to move,
+# the castling rights and the en passant file. The keys are seeded so hashes
+# stay the same from one run to the next.
+
+import random
+
+from bitboard import COLORS, PIECE_TYPES
+
+WHITE_KINGSIDE = 1
+WHITE_QUEENSIDE = 2
+BLACK_KINGSIDE = 4
+BLACK_QUEENSIDE = 8
+
+_rng = random.Random(0x5EED)
+
+PIECES = {color: {piece_type: [_rng.getrandbits(64) for sq in range(64)]
+                  for piece_type in PIECE_TYPES}
+          for color in COLORS}
+# The same keys indexed by color and piece type code, see core.Piece
+PIECE_KEYS = [[PIECES[color][piece_type] for piece_type in PIECE_TYPES] for color in COLORS]
+BLACK_TO_MOVE = _rng.getrandbits(64)
+CASTLING = [_rng.getrandbits(64) for rights in range(16)]
+EN_PASSANT = [_rng.getrandbits(64) for col in range(8)]
+
+# Not part of a position's hash: XOR one into it to key facts about a move
+# (from square, to square) in that position.
+MOVES = [[_rng.getrandbits(64) for to_sq in range(64)] for from_sq in range(64)]
+
+
+def compute(board, current_turn, castling_rights, en_passant_target):
+    """Hash a position from scratch"""
+    key = 0
+    for row in range(8):
+        for col in range(8):
+            piece = board[row][col]
+            if piece is not None:
+                key ^= PIECES[piece.color][piece.type][row * 8 + col]
+    if current_turn == 'black':
+        key ^= BLACK_TO_MOVE
+    key ^= CASTLING[castling_rights]
+    if en_passant_target:
+        key ^= EN_PASSANT[en_passant_target[1]]
+    return key